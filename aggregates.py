@@ -0,0 +1,139 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+
+
+class PriceHistogram:
+    # Order statistics over prices: prices are a few dozen distinct integers, so a
+    # sorted list of distinct values plus counts answers rank queries by bisecting
+    # a lazily rebuilt prefix-sum array.
+    def __init__(self):
+        self.values = []
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self._prefix = None
+
+    def copy(self):
+        other = PriceHistogram()
+        other.values = list(self.values)
+        other.counts = dict(self.counts)
+        other.total = self.total
+        other.sum = self.sum
+        return other
+
+    def add(self, price, count=1):
+        if price not in self.counts:
+            insort(self.values, price)
+            self.counts[price] = 0
+        self.counts[price] += count
+        self.total += count
+        self.sum += price * count
+        self._prefix = None
+
+    def remove(self, price, count=1):
+        current = self.counts.get(price, 0)
+        if current < count:
+            raise ValueError(f"price {price} removed more times than it was added")
+        if current == count:
+            del self.counts[price]
+            del self.values[bisect_left(self.values, price)]
+        else:
+            self.counts[price] = current - count
+        self.total -= count
+        self.sum -= price * count
+        self._prefix = None
+
+    def _cumulative(self):
+        prefix = self._prefix
+        if prefix is None:
+            prefix = []
+            running = 0
+            for value in self.values:
+                running += self.counts[value]
+                prefix.append(running)
+            self._prefix = prefix
+        return prefix
+
+    def value_at(self, index):
+        if not 0 <= index < self.total:
+            raise IndexError(index)
+        return self.values[bisect_right(self._cumulative(), index)]
+
+    def percentile(self, q):
+        return self.value_at(min(self.total - 1, int(q * self.total)))
+
+    def median(self):
+        return self.value_at(self.total // 2)
+
+    def min(self):
+        return self.values[0]
+
+    def max(self):
+        return self.values[-1]
+
+
+class CardAggregates:
+    def __init__(self, cards=()):
+        self.total = 0
+        self.cpu_counts = Counter()
+        self.gpu_counts = Counter()
+        self.ram_counts = Counter()
+        self.prices = PriceHistogram()
+        for card in cards:
+            self.add(card)
+
+    def copy(self):
+        other = CardAggregates()
+        other.total = self.total
+        other.cpu_counts = self.cpu_counts.copy()
+        other.gpu_counts = self.gpu_counts.copy()
+        other.ram_counts = self.ram_counts.copy()
+        other.prices = self.prices.copy()
+        return other
+
+    def add(self, card, count=1):
+        self.total += count
+        self.cpu_counts[card.cpu] += count
+        self.gpu_counts[card.gpu] += count
+        self.ram_counts[card.ram] += count
+        if card.price_value is not None:
+            self.prices.add(card.price_value, count)
+
+    def remove(self, card, count=1):
+        self.total -= count
+        for counts, key in ((self.cpu_counts, card.cpu), (self.gpu_counts, card.gpu), (self.ram_counts, card.ram)):
+            counts[key] -= count
+            if counts[key] <= 0:
+                del counts[key]
+        if card.price_value is not None:
+            self.prices.remove(card.price_value, count)
+
+    def apply_delta(self, added, removed):
+        for card, count in removed.items():
+            self.remove(card, count)
+        for card, count in added.items():
+            self.add(card, count)
+
+    def positive_prices(self):
+        # generate_statistics has always ignored zero prices for min/avg
+        zero_count = self.prices.counts.get(0, 0)
+        count = self.prices.total - zero_count
+        if count <= 0:
+            return None
+        return {
+            'count': count,
+            'avg': self.prices.sum / count,
+            'min': self.prices.value_at(zero_count),
+            'max': self.prices.max(),
+        }
+
+
+def build_aggregates(cards, previous_cards=None, previous=None):
+    if previous is None or previous_cards is None:
+        return CardAggregates(cards)
+
+    old_counts = Counter(previous_cards)
+    new_counts = Counter(cards)
+    aggregates = previous.copy()
+    aggregates.apply_delta(new_counts - old_counts, old_counts - new_counts)
+    return aggregates
@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from ingest import read_json, write_json_atomic
+
+AI_CACHE_MAX_ENTRIES = 256
+AI_CACHE_TTL = 6 * 60 * 60
+# new answers are written to disk at most this often, from a timer thread
+AI_CACHE_FLUSH_DELAY = 2
+
+
+def normalize_prompt(prompt):
+    return ' '.join(prompt.lower().split())
+
+
+def cache_key(dataset_fingerprint, prompt):
+    payload = f"{dataset_fingerprint}\0{normalize_prompt(prompt)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _silence_unretrieved(future):
+    if not future.cancelled():
+        future.exception()
+
+
+class AIResponseCache:
+    def __init__(self, max_entries=AI_CACHE_MAX_ENTRIES, ttl=AI_CACHE_TTL, disk_path=None, clock=time.time,
+                 flush_delay=AI_CACHE_FLUSH_DELAY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.flush_delay = flush_delay
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._flush_timer = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if disk_path:
+            self._load()
+
+    def _load(self):
+        now = self._clock()
+        stored = read_json(self.disk_path, {})
+        for key, (text, expires_at) in sorted(stored.items(), key=lambda item: item[1][1]):
+            if expires_at > now:
+                self._entries[key] = (text, expires_at)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def flush(self):
+        # put() runs on the AI loop, so the file is written here, on a timer
+        # thread (or at shutdown), never while AI coroutines wait on the disk
+        if not self.disk_path:
+            return
+        with self._lock:
+            timer, self._flush_timer = self._flush_timer, None
+            data = {key: [text, expires_at] for key, (text, expires_at) in self._entries.items()}
+        if timer is not None:
+            timer.cancel()
+        with self._save_lock:
+            try:
+                write_json_atomic(self.disk_path, data)
+            except OSError as e:
+                print(f"Не удалось сохранить кэш AI: {e}")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            text, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = (text, self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            timer = None
+            if self.disk_path and self._flush_timer is None:
+                timer = self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                timer.daemon = True
+        if timer is not None:
+            timer.start()
+
+    async def get_or_compute(self, dataset_fingerprint, prompt, compute):
+        # Must run on the AI runtime loop: in-flight futures belong to that loop,
+        # so a burst of identical taps ends up awaiting a single Gemini call.
+        key = cache_key(dataset_fingerprint, prompt)
+        text = self.get(key)
+        if text is not None:
+            self.hits += 1
+            return text
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_silence_unretrieved)
+        self._inflight[key] = future
+        try:
+            text = await compute()
+        except asyncio.CancelledError:
+            future.set_exception(TimeoutError("AI request was cancelled"))
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            if text:
+                self.put(key, text)
+            future.set_result(text)
+            return text
+        finally:
+            self._inflight.pop(key, None)
@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+AI_MAX_CONCURRENCY = 4
+AI_MAX_PENDING = 32
+AI_TIMEOUT = 90
+AI_WORKERS = 8
+AI_DELIVERY_WORKERS = 4
+
+
+class AIBusyError(Exception):
+    pass
+
+
+class AIRuntime:
+    # One event loop thread for every AI request. Blocking SDK calls run on a
+    # bounded thread pool and the Telegram replies that follow them on another,
+    # so handler threads only enqueue work and return. A request keeps its
+    # concurrency slot until its SDK calls have returned, even after it timed
+    # out: the thread cannot be interrupted and is still talking to the API.
+    def __init__(self, max_concurrency=AI_MAX_CONCURRENCY, max_pending=AI_MAX_PENDING,
+                 timeout=AI_TIMEOUT, workers=AI_WORKERS, delivery_workers=AI_DELIVERY_WORKERS):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._workers = workers
+        self._delivery_workers = delivery_workers
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._delivery_executor = None
+        self._semaphore = None
+        # blocking calls started by the request running in the current task
+        self._blocking_calls = contextvars.ContextVar('ai_blocking_calls')
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='ai-worker')
+            self._delivery_executor = ThreadPoolExecutor(max_workers=self._delivery_workers,
+                                                         thread_name_prefix='ai-deliver')
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name='ai-loop', daemon=True)
+            self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    def run_blocking(self, func, *args):
+        # awaitable from inside AI coroutines: keeps the loop free while the SDK blocks
+        future = self._executor.submit(func, *args)
+        calls = self._blocking_calls.get(None)
+        if calls is not None:
+            calls.append(future)
+        return asyncio.wrap_future(future)
+
+    def submit(self, coro_factory, on_result, on_error):
+        self.start()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise AIBusyError()
+            self._pending += 1
+        return asyncio.run_coroutine_threadsafe(self._run(coro_factory, on_result, on_error), self._loop)
+
+    async def _run(self, coro_factory, on_result, on_error):
+        loop = asyncio.get_running_loop()
+        calls = []
+        self._blocking_calls.set(calls)
+        try:
+            async with self._semaphore:
+                try:
+                    result = await asyncio.wait_for(coro_factory(), self.timeout)
+                except asyncio.TimeoutError:
+                    logging.error(f"AI request timed out after {self.timeout}s")
+                    callback, value = on_error, TimeoutError(f"AI request timed out after {self.timeout}s")
+                except Exception as e:
+                    logging.error(f"AI request failed: {e}")
+                    callback, value = on_error, e
+                else:
+                    callback, value = on_result, result
+                delivery = loop.create_task(self._deliver(loop, callback, value))
+                # a timed-out SDK call is still running: the slot is free once it returns
+                running = [asyncio.wrap_future(future) for future in calls if not future.done()]
+                if running:
+                    await asyncio.wait(running)
+            await delivery
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._idle.notify_all()
+
+    async def _deliver(self, loop, callback, value):
+        try:
+            await loop.run_in_executor(self._delivery_executor, callback, value)
+        except Exception as e:
+            logging.error(f"Error delivering AI response: {e}")
+
+    def drain(self, timeout=None):
+        with self._lock:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def shutdown(self, wait=True, timeout=None):
+        if wait:
+            self.drain(timeout)
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            executors = (self._executor, self._delivery_executor)
+            self._loop = self._thread = self._executor = self._delivery_executor = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(self._cancel_and_stop, loop)
+        thread.join()
+        for executor in executors:
+            executor.shutdown(wait=wait)
+        loop.close()
+
+    @staticmethod
+    def _cancel_and_stop(loop):
+        tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            gathered = asyncio.gather(*tasks, return_exceptions=True)
+            gathered.add_done_callback(lambda _: loop.stop())
+        else:
+            loop.stop()
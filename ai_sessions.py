@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+
+from ai_summary import estimate_tokens
+
+MAX_SESSIONS = 1000
+SESSION_IDLE_TTL = 30 * 60
+HISTORY_TOKEN_CAP = 3000
+MAX_STORED_RESPONSE_CHARS = 1500
+CONDENSED_QUESTION_CHARS = 80
+RECAP_PREFIX = "Ранее обсуждалось:"
+
+
+def _turn(role, text):
+    return {'role': role, 'parts': [text]}
+
+
+def _turn_text(turn):
+    return turn['parts'][0]
+
+
+def history_text(history):
+    return '\n'.join(f"{turn['role']}: {_turn_text(turn)}" for turn in history)
+
+
+class ChatSession:
+    __slots__ = ('fingerprint', 'history', 'tokens', 'last_used')
+
+    def __init__(self, fingerprint, now):
+        self.fingerprint = fingerprint
+        self.history = []
+        self.tokens = 0
+        self.last_used = now
+
+
+class ChatSessionPool:
+    # history[0:2] is always the opening exchange that carried the data summary;
+    # follow-ups only send the new question on top of it.
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_ttl=SESSION_IDLE_TTL,
+                 token_cap=HISTORY_TOKEN_CAP, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.token_cap = token_cap
+        self._clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def prepare(self, chat_id, fingerprint, question, context_prompt):
+        # returns (history, message); a fresh or stale session starts from the full context
+        with self._lock:
+            now = self._clock()
+            self._evict_idle(now)
+            session = self._sessions.get(chat_id)
+            if session is None or session.fingerprint != fingerprint or not session.history:
+                return [], context_prompt
+            session.last_used = now
+            self._sessions.move_to_end(chat_id)
+            return list(session.history), question
+
+    def record(self, chat_id, fingerprint, message, response):
+        with self._lock:
+            now = self._clock()
+            session = self._sessions.get(chat_id)
+            if session is None or session.fingerprint != fingerprint:
+                session = ChatSession(fingerprint, now)
+                self._sessions[chat_id] = session
+            # long answers only need their gist to keep follow-ups on track
+            response = response[:MAX_STORED_RESPONSE_CHARS]
+            session.history.append(_turn('user', message))
+            session.history.append(_turn('model', response))
+            session.tokens += estimate_tokens(message) + estimate_tokens(response)
+            session.last_used = now
+            self._sessions.move_to_end(chat_id)
+            self._truncate(session)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def reset(self, chat_id):
+        with self._lock:
+            self._sessions.pop(chat_id, None)
+
+    def _evict_idle(self, now):
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_ttl:
+                break
+            del self._sessions[chat_id]
+
+    def _truncate(self, session):
+        if session.tokens <= self.token_cap or len(session.history) <= 4:
+            return
+
+        # keep the context exchange and the latest exchange, fold the middle into
+        # one short recap turn so the model still knows what was already asked
+        head, middle, tail = session.history[:2], session.history[2:-2], session.history[-2:]
+        asked = []
+        for turn in middle:
+            text = _turn_text(turn)
+            if turn['role'] != 'user':
+                continue
+            if text.startswith(RECAP_PREFIX):
+                asked.append(text[len(RECAP_PREFIX):].strip())
+            else:
+                asked.append(text[:CONDENSED_QUESTION_CHARS])
+        recap = "; ".join(asked)[-CONDENSED_QUESTION_CHARS * 4:]
+        recap = f"{RECAP_PREFIX} {recap}"
+        session.history = head + [_turn('user', recap), _turn('model', "Понял.")] + tail
+        session.tokens = sum(estimate_tokens(_turn_text(turn)) for turn in session.history)
+
+        if session.tokens > self.token_cap:
+            # even the context plus one exchange is over the cap: start over next time
+            session.history = []
+            session.tokens = 0
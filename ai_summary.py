@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+AI_SUMMARY_TOKEN_BUDGET = 700
+MAX_TOP_N = 10
+MIN_TOP_N = 3
+PRICE_PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+NOMINAL_VRAM_GB = (2, 3, 4, 6, 8, 10, 11, 12, 16, 20, 24, 32, 48)
+
+AISummary = namedtuple('AISummary', ['total', 'price_min', 'price_max', 'text', 'tokens'])
+
+
+def estimate_tokens(text):
+    # Gemini averages roughly 3 characters per token on mixed Russian/English text
+    return len(text) // 3 + 1
+
+
+def nominal_vram_gb(vram_mb):
+    # drivers report slightly less than the marketing size (7957 Mb -> 8 GB)
+    return min(NOMINAL_VRAM_GB, key=lambda size: abs(size * 1024 - vram_mb))
+
+
+def vram_price_buckets(cards):
+    buckets = {}
+    for card in cards:
+        if card.vram_mb is None or not card.price_value:
+            continue
+        buckets.setdefault(nominal_vram_gb(card.vram_mb), []).append(card.price_value)
+
+    rows = []
+    for size in sorted(buckets):
+        prices = sorted(buckets[size])
+        median = prices[len(prices) // 2]
+        rows.append((size, len(prices), median, median / size))
+    return rows
+
+
+def _top_lines(counts, total, top_n):
+    return [
+        f"  {name}: {count} ({count / total * 100:.1f}%)"
+        for name, count in counts.most_common(top_n)
+    ]
+
+
+def _render(aggregates, vram_rows, top_n, sections):
+    total = aggregates.total
+    prices = aggregates.prices
+    lines = [f"Всего компьютеров: {total}"]
+
+    if prices.total:
+        percentiles = ', '.join(
+            f"p{int(q * 100)} {prices.percentile(q)}" for q in PRICE_PERCENTILES
+        )
+        lines.append(
+            f"Цены, ₽/час: мин {prices.min()}, {percentiles}, макс {prices.max()}, "
+            f"средняя {prices.sum / prices.total:.1f}"
+        )
+
+    lines.append(f"Топ-{top_n} CPU из {len(aggregates.cpu_counts)} моделей:")
+    lines.extend(_top_lines(aggregates.cpu_counts, total, top_n))
+    lines.append(f"Топ-{top_n} GPU из {len(aggregates.gpu_counts)} моделей:")
+    lines.extend(_top_lines(aggregates.gpu_counts, total, top_n))
+
+    if 'ram' in sections:
+        lines.append("ОЗУ: " + ', '.join(
+            f"{ram} — {count}" for ram, count in aggregates.ram_counts.most_common(top_n)
+        ))
+    if 'vram' in sections and vram_rows:
+        lines.append("Видеопамять (объём: машин, медианная цена, ₽/час за 1 ГБ):")
+        lines.extend(
+            f"  {size} ГБ: {count}, {median} ₽, {per_gb:.2f} ₽/ГБ"
+            for size, count, median, per_gb in vram_rows
+        )
+    return '\n'.join(lines)
+
+
+def build_ai_summary(cards, aggregates, token_budget=AI_SUMMARY_TOKEN_BUDGET):
+    vram_rows = vram_price_buckets(cards)
+    sections = ['ram', 'vram']
+    top_n = MAX_TOP_N
+
+    # shrink the top lists first, then drop the least important sections
+    text = _render(aggregates, vram_rows, top_n, sections)
+    while estimate_tokens(text) > token_budget:
+        if top_n > MIN_TOP_N:
+            top_n -= 1
+        elif sections:
+            sections.pop(0)
+        else:
+            break
+        text = _render(aggregates, vram_rows, top_n, sections)
+
+    prices = aggregates.prices
+    return AISummary(
+        aggregates.total,
+        prices.min() if prices.total else None,
+        prices.max() if prices.total else None,
+        text,
+        estimate_tokens(text),
+    )
@@ -0,0 +1,247 @@
+import argparse
+import gc
+import html
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("ТОКЕН БОТА", "0:benchmark")
+os.environ.setdefault("GEMINI_FAKE", "1")
+
+import main
+from aggregates import build_aggregates
+from card_parser import iter_card_blocks, iter_cards, iter_cards_from_file, iter_file_chunks
+from ingest import merge_by_config
+from records import build_records, parse_price
+from search_index import SearchIndex
+
+DEFAULT_SIZES = '1000,10000,100000,1000000'
+COMPONENT_QUERIES = [('cpu', 'i5-12400F'), ('cpu', 'ryzen 5'), ('gpu', 'RTX 4060'), ('gpu', '3060'), ('ram', '32')]
+FULL_QUERIES = ['i5-12400F RTX 4060 16GB', 'ryzen 7 4070 super 32 gb']
+STATS_FUNCTIONS = ['get_quick_overview', 'get_price_stats', 'get_cpu_stats', 'get_gpu_stats', 'get_ram_stats']
+GPU_SUFFIX_RE = re.compile(r'\s*\d+\s*[MG]b\s*$', re.IGNORECASE)
+
+# a stage is only a regression if it is both relatively and absolutely slower / bigger
+MIN_TIME_DELTA = 0.001
+MIN_MEMORY_DELTA_KB = 1024
+
+
+def load_template(html_file):
+    # one real card block with its values swapped for markers, plus the page header
+    chunks = list(iter_file_chunks(html_file))
+    page = ''.join(chunks)
+    computer_id, block = next(iter_card_blocks(chunks))
+    card = next(iter_cards([block]))
+    header = page[:page.index(block)]
+
+    gpu_short = GPU_SUFFIX_RE.sub('', card['gpu'])
+    template = block
+    for value, marker in [
+        (card['cpu'], '\0cpu\0'),
+        (card['gpu'], '\0gpu\0'),
+        (f'data-gpu="{gpu_short}"', 'data-gpu="\0gpu_short\0"'),
+        (card['ram'], '\0ram\0'),
+        ('>' + card['price'].replace(' ₽', ''), '>\0price\0'),
+    ]:
+        if value not in template:
+            raise ValueError(f"В карточке {computer_id} не найдено {value!r}")
+        template = template.replace(value, marker)
+    template = re.sub(rf'(?<!\d){computer_id}(?!\d)', '\0id\0', template)
+    return header, template
+
+
+def load_vocabulary(json_file):
+    with open(json_file, 'r', encoding='utf-8') as f:
+        cards = json.load(f)
+    # sampling from the card list, not the distinct names, keeps the real frequencies
+    return {
+        'cpu': [card['cpu'] for card in cards if card.get('cpu')],
+        'gpu': [card['gpu'] for card in cards if card.get('gpu')],
+        'ram': [card['ram'] for card in cards if card.get('ram')],
+        'price': [str(price) for price in (parse_price(card.get('price', '')) for card in cards) if price],
+    }
+
+
+def generate_dump(path, size, header, template, vocabulary, rng):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(header)
+        for computer_id in range(100000, 100000 + size):
+            gpu = rng.choice(vocabulary['gpu'])
+            f.write(
+                template
+                .replace('\0cpu\0', html.escape(rng.choice(vocabulary['cpu']), quote=False))
+                .replace('\0gpu_short\0', html.escape(GPU_SUFFIX_RE.sub('', gpu)))
+                .replace('\0gpu\0', html.escape(gpu, quote=False))
+                .replace('\0ram\0', rng.choice(vocabulary['ram']))
+                .replace('\0price\0', rng.choice(vocabulary['price']))
+                .replace('\0id\0', str(computer_id))
+            )
+        f.write('</div>\n')
+    return os.path.getsize(path)
+
+
+def measure(func, repeat, memory):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    row = {'seconds': round(min(timings), 6)}
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        result = func()
+        row['peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return row, result
+
+
+def run_size(size, args, header, template, vocabulary):
+    rng = random.Random(args.seed + size)
+    path = os.path.join(args.workdir, f'bench_{size}.html')
+    dump_bytes = generate_dump(path, size, header, template, vocabulary, rng)
+    stages = {}
+
+    def stage(name, func, repeat=args.repeat):
+        stages[name], result = measure(func, repeat, args.memory)
+        print(f"{size:>8} {name:<28} {stages[name]['seconds'] * 1000:>12.3f} ms"
+              + (f" {stages[name]['peak_kb']:>10} KB" if 'peak_kb' in stages[name] else ''))
+        return result
+
+    if size <= args.max_in_memory:
+        with open(path, 'r', encoding='utf-8') as f:
+            page = f.read()
+        cards = stage('parse_html_cards_simplified', lambda: main.parse_html_cards_simplified(page))
+        del page
+    else:
+        cards = stage('parse_stream', lambda: list(iter_cards_from_file(path)))
+    if len(cards) != size:
+        raise RuntimeError(f"Из синтетического дампа разобрано {len(cards)} карточек вместо {size}")
+
+    stage('dedupe', lambda: merge_by_config([], cards))
+    records = stage('build_records', lambda: build_records(cards))
+    del cards
+    aggregates = stage('build_aggregates', lambda: build_aggregates(records))
+    for name in STATS_FUNCTIONS:
+        stats_function = getattr(main, name)
+        stage(name, lambda: stats_function(aggregates))
+    stage('format_stats_for_telegram',
+          lambda: main.format_stats_for_telegram(main.generate_statistics(aggregates), records))
+
+    index = stage('build_search_index', lambda: SearchIndex(records))
+    stage('search_by_component', lambda: [
+        main.search_by_component(index, component_type, query) for component_type, query in COMPONENT_QUERIES
+    ])
+    results = stage('search_by_full_config', lambda: [main.search_by_full_config(index, query) for query in FULL_QUERIES])
+    stage('format_config_results', lambda: (
+        main.format_config_results(records, 0),
+        main.format_config_results(records, len(records)),
+        [main.format_config_results(found, 0) for found in results],
+    ))
+
+    listing = main.format_config_results(records[:args.split_cards], 0, page_size=args.split_cards)
+    stage('split_long_message', lambda: main.split_long_message(listing))
+
+    if not args.keep:
+        os.remove(path)
+    return {'dump_bytes': dump_bytes, 'split_chars': len(listing), 'stages': stages}
+
+
+def run(args):
+    header, template = load_template(args.html_file)
+    vocabulary = load_vocabulary(args.json_file)
+    report = {
+        'meta': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'sizes': {},
+    }
+    for size in args.sizes:
+        report['sizes'][str(size)] = run_size(size, args, header, template, vocabulary)
+    return report
+
+
+def compare(base_file, new_file, threshold):
+    with open(base_file, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_file, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    regressions = 0
+    for size, new_run in new['sizes'].items():
+        base_run = base['sizes'].get(size)
+        if base_run is None:
+            continue
+        for name, new_stage in new_run['stages'].items():
+            base_stage = base_run['stages'].get(name)
+            if base_stage is None:
+                continue
+            old_time, new_time = base_stage['seconds'], new_stage['seconds']
+            flags = []
+            if new_time > old_time * (1 + threshold) and new_time - old_time > MIN_TIME_DELTA:
+                flags.append('время')
+            old_peak, new_peak = base_stage.get('peak_kb'), new_stage.get('peak_kb')
+            if (old_peak is not None and new_peak is not None
+                    and new_peak > old_peak * (1 + threshold) and new_peak - old_peak > MIN_MEMORY_DELTA_KB):
+                flags.append('память')
+            regressions += bool(flags)
+            ratio = new_time / old_time if old_time else float('inf')
+            print(
+                f"{size:>8} {name:<28} {old_time * 1000:>10.3f} -> {new_time * 1000:>10.3f} ms  x{ratio:.2f}"
+                + (f"  РЕГРЕССИЯ ({', '.join(flags)})" if flags else '')
+            )
+    print(f"Регрессий: {regressions}")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера parse -> dedupe -> stats -> search на синтетических дампах")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--html-file', default='cards.txt', help="откуда взять разметку карточки")
+    parser.add_argument('--json-file', default='cards_data.json', help="откуда взять словарь CPU/GPU/RAM/цен")
+    parser.add_argument('--max-in-memory', type=int, default=100000,
+                        help="больше стольких карточек дамп разбирается потоково, а не одной строкой")
+    parser.add_argument('--split-cards', type=int, default=2000, help="сколько карточек в тексте для split_long_message")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="не замерять пиковую память")
+    parser.add_argument('--workdir', default=None)
+    parser.add_argument('--keep', action='store_true', help="не удалять сгенерированные дампы")
+    parser.add_argument('--output', default='bench_pipeline.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="сравнить два прогона")
+    parser.add_argument('--threshold', type=float, default=0.15, help="допустимое замедление, доля")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+
+    args.sizes = [int(size) for size in args.sizes.split(',')]
+    created_workdir = args.workdir is None
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix='fogplay-bench-')
+    try:
+        report = run(args)
+    finally:
+        if created_workdir and not args.keep:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+
+if __name__ == '__main__':
+    main_cli()
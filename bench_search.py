@@ -0,0 +1,148 @@
+import argparse
+import json
+import random
+import time
+
+from records import CardRecord, build_records
+from search_index import SearchIndex
+
+QUERIES = [
+    ('gpu', 'RTX 4060'),
+    ('cpu', 'i5-12400F'),
+    ('ram', '64GB'),
+    (None, 'i5-12400F RTX 4060 16GB'),
+]
+
+# queries the index must answer exactly like the old substring scan. Glued units
+# ("16GB" vs "16 Gb") and matches inside a token are where the index differs on purpose.
+PARITY_QUERIES = [
+    ('cpu', 'ryzen 5'),
+    ('cpu', 'ryzen 7'),
+    ('cpu', 'ryzen 9 5900x'),
+    ('cpu', 'i5-12400F'),
+    ('gpu', 'rtx 4060'),
+    ('gpu', 'RTX 4060 Ti'),
+    ('gpu', 'rx 6900 xt'),
+    ('ram', '32 gb'),
+    (None, 'i5-12400F RTX 4060'),
+    (None, 'i7-12700 RTX 4070 SUPER'),
+]
+
+
+def filler_card(rng):
+    # machines that never match the benchmark queries, so the result size stays
+    # constant and only the cost of looking past the rest of the dataset shows
+    return CardRecord.from_card({
+        'cpu': f"Vendor{rng.randint(1, 500)} CPU Q{rng.randint(1000, 99999)}",
+        'gpu': f"Vendor{rng.randint(1, 500)} GPU Z{rng.randint(100, 9999)} {rng.randint(1000, 9999)} Mb",
+        'ram': f"{rng.choice([3, 6, 12, 24, 48])} Gb",
+        'price': f"{rng.randint(10, 200)} ₽",
+    })
+
+
+def build_cards(base_cards, total, seed=0):
+    rng = random.Random(seed)
+    cards = list(base_cards)
+    while len(cards) < total:
+        cards.append(filler_card(rng))
+    rng.shuffle(cards)
+    return tuple(cards)
+
+
+def linear_component(cards, component_type, query):
+    query = query.lower()
+    return [card for card in cards if query in getattr(card, component_type).lower()]
+
+
+def linear_full_config(cards, query):
+    results = []
+    query_parts = query.lower().split()
+    for card in cards:
+        card_text = (f"{card.cpu} {card.gpu} {card.ram}").lower()
+        matches = sum(1 for part in query_parts if part in card_text)
+        if matches >= len(query_parts) / 2:
+            results.append((matches / len(query_parts), card))
+    return [card for score, card in sorted(results, key=lambda x: x[0], reverse=True)]
+
+
+def check_parity(cards, queries=PARITY_QUERIES):
+    # [(field, query, indexed count, linear count)] for every query that differs
+    index = SearchIndex(cards)
+    mismatches = []
+    for component_type, query in queries:
+        if component_type is None:
+            indexed, linear = index.search_full_config(query), linear_full_config(cards, query)
+        else:
+            indexed, linear = index.search_component(component_type, query), linear_component(cards, component_type, query)
+        if indexed != linear:
+            mismatches.append((component_type or 'full', query, len(indexed), len(linear)))
+    return mismatches
+
+
+def time_query(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def run(sizes, repeat, json_file):
+    with open(json_file, 'r', encoding='utf-8') as f:
+        base_cards = build_records(json.load(f))
+
+    rows = []
+    for size in sizes:
+        cards = build_cards(base_cards, size)
+        start = time.perf_counter()
+        index = SearchIndex(cards)
+        build_time = time.perf_counter() - start
+
+        for component_type, query in QUERIES:
+            if component_type is None:
+                indexed = lambda: index.search_full_config(query)
+                linear = lambda: linear_full_config(cards, query)
+            else:
+                indexed = lambda: index.search_component(component_type, query)
+                linear = lambda: linear_component(cards, component_type, query)
+            rows.append({
+                'cards': len(cards),
+                'field': component_type or 'full',
+                'query': query,
+                'index_build_s': round(build_time, 4),
+                'indexed_ms': round(time_query(indexed, repeat) * 1000, 3),
+                'linear_ms': round(time_query(linear, repeat) * 1000, 3),
+                'results': len(indexed()),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк поиска: индекс против линейного прохода")
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json-file', default='cards_data.json')
+    parser.add_argument('--check', action='store_true', help="только сверить результаты индекса с линейным проходом")
+    args = parser.parse_args()
+
+    if args.check:
+        with open(args.json_file, 'r', encoding='utf-8') as f:
+            mismatches = check_parity(build_records(json.load(f)))
+        for field, query, indexed, linear in mismatches:
+            print(f"{field:>5} {query:<26} индекс {indexed}, линейный проход {linear}")
+        print(f"Расхождений: {len(mismatches)}")
+        raise SystemExit(1 if mismatches else 0)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    for row in run(sizes, args.repeat, args.json_file):
+        print(
+            f"{row['cards']:>8} {row['field']:>5} {row['query']:<26} "
+            f"index {row['indexed_ms']:>9.3f} ms   linear {row['linear_ms']:>9.3f} ms   "
+            f"найдено {row['results']}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import hmac
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+HANDLER_WORKERS = 8
+HANDLER_MAX_PENDING = 64
+POLL_TIMEOUT = 25
+POLL_ERROR_BACKOFF = (1, 2, 5, 10, 30)
+WEBHOOK_PATH = '/telegram'
+WEBHOOK_SUBMIT_TIMEOUT = 5
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class HandlerPool:
+    # Runs bot.process_new_updates on a fixed set of threads. At most
+    # max_pending updates are queued or running; past that submit() blocks,
+    # so a burst slows down getUpdates instead of piling up in memory.
+    def __init__(self, workers=HANDLER_WORKERS, max_pending=HANDLER_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='handler')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._closed = False
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, func, *args, timeout=None):
+        # False when the pool is shut down or no slot freed up within timeout
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        with self._lock:
+            if self._closed:
+                self._slots.release()
+                return False
+            self._pending += 1
+        try:
+            self._executor.submit(self._run, func, args)
+        except Exception:
+            self._finish()
+            raise
+        return True
+
+    def _run(self, func, args):
+        try:
+            func(*args)
+        except Exception as e:
+            logging.error(f"Update handler failed: {e}")
+        finally:
+            self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+        self._slots.release()
+
+    def drain(self, timeout=None):
+        with self._lock:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def shutdown(self, wait=True, timeout=None):
+        with self._lock:
+            self._closed = True
+        drained = self.drain(timeout) if wait else False
+        self._executor.shutdown(wait=drained)
+        return drained
+
+
+class BotRuntime:
+    # Feeds updates to the bot's handlers on a HandlerPool, either from a
+    # getUpdates long-polling thread or from a local webhook server. The bot
+    # must be created with threaded=False so handlers run on the pool's threads.
+    def __init__(self, bot, workers=HANDLER_WORKERS, max_pending=HANDLER_MAX_PENDING,
+                 poll_timeout=POLL_TIMEOUT, allowed_updates=None):
+        self.bot = bot
+        self.poll_timeout = poll_timeout
+        self.allowed_updates = allowed_updates
+        self.pool = HandlerPool(workers, max_pending)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._server = None
+        self._offset = None
+        self._confirmed = None
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def _dispatch(self, update):
+        self.bot.process_new_updates([update])
+
+    def start_polling(self):
+        # getUpdates fails while a webhook is set
+        self.bot.delete_webhook()
+        self._thread = threading.Thread(target=self._poll, name='polling', daemon=True)
+        self._thread.start()
+
+    def _poll(self):
+        errors = 0
+        while not self._stopping.is_set():
+            try:
+                self._confirmed = self._offset
+                updates = self.bot.get_updates(
+                    offset=self._offset,
+                    timeout=self.poll_timeout + 10,
+                    allowed_updates=self.allowed_updates,
+                    long_polling_timeout=self.poll_timeout,
+                )
+            except Exception as e:
+                if self._stopping.is_set():
+                    return
+                delay = POLL_ERROR_BACKOFF[min(errors, len(POLL_ERROR_BACKOFF) - 1)]
+                errors += 1
+                logging.error(f"getUpdates failed: {e}, retrying in {delay}s")
+                self._stopping.wait(delay)
+                continue
+            errors = 0
+            for update in updates:
+                # an update is only confirmed by a later getUpdates, so one that
+                # is not handed to the pool here is redelivered after a restart
+                if self._stopping.is_set() or not self.pool.submit(self._dispatch, update):
+                    return
+                self._offset = update.update_id + 1
+
+    def _confirm_offset(self):
+        if self._offset == self._confirmed:
+            return
+        try:
+            # telebot treats a long polling timeout of 0 as "use the default"
+            self.bot.get_updates(offset=self._offset, limit=1, timeout=5, long_polling_timeout=1)
+        except Exception as e:
+            logging.error(f"Could not confirm handled updates: {e}")
+
+    def start_webhook(self, url, host='127.0.0.1', port=8443, path=WEBHOOK_PATH, secret_token=None):
+        # TLS is expected to terminate in a reverse proxy in front of host:port
+        self._server = ThreadingHTTPServer((host, port), self._webhook_handler(path, secret_token))
+        self._server.daemon_threads = True
+        if url:
+            self.bot.set_webhook(url=url.rstrip('/') + path, secret_token=secret_token,
+                                 allowed_updates=self.allowed_updates)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='webhook', daemon=True)
+        self._thread.start()
+        print(f"Вебхук слушает http://{host}:{self._server.server_address[1]}{path}")
+
+    def _webhook_handler(self, path, secret_token):
+        runtime = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split('?', 1)[0] != path:
+                    self.send_error(404)
+                    return
+                if secret_token and not hmac.compare_digest(self.headers.get(SECRET_HEADER, ''), secret_token):
+                    self.send_error(403)
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    update = types.Update.de_json(json.loads(self.rfile.read(length).decode('utf-8')))
+                except Exception:
+                    self.send_error(400)
+                    return
+                # any non-2xx makes Telegram redeliver the update later
+                if runtime.stopping or not runtime.pool.submit(runtime._dispatch, update,
+                                                               timeout=WEBHOOK_SUBMIT_TIMEOUT):
+                    self.send_error(503)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return WebhookHandler
+
+    def wait(self):
+        # returns once stop() is called, e.g. from a signal handler
+        self._stopping.wait()
+
+    def stop(self):
+        self._stopping.set()
+
+    def shutdown(self, timeout=None):
+        # stop taking updates, let in-flight handlers finish, then confirm them
+        self.stop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        started = time.monotonic()
+        drained = self.pool.shutdown(wait=True, timeout=timeout)
+        if not drained:
+            logging.warning(f"{self.pool.pending} update handlers still running after {time.monotonic() - started:.1f}s")
+        if self._server is None:
+            self._confirm_offset()
+        return drained
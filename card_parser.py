@@ -0,0 +1,226 @@
+import re
+from html.parser import HTMLParser
+
+CARD_CLASS_MARKER = 'card card-outside computer-'
+CHUNK_SIZE = 64 * 1024
+
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+])
+
+NO_PRICE = "Цена не указана"
+
+CARD_START_RE = re.compile(r'<div\s[^>]*?class="[^"]*?card card-outside computer-(\d*)(?=\D)')
+DATA_COMPUTER_RE = re.compile(r'data-computer="(\d+)"')
+BLOCK_PREFIX_KEEP = 512
+
+
+def _class_string(attrs):
+    for name, value in attrs:
+        if name == 'class' and value:
+            return ' '.join(value.split())
+    return ''
+
+
+def _has_class(class_string, class_name):
+    return class_name in class_string.split()
+
+
+def format_price(price_text):
+    price_digits = ''.join(c for c in price_text if c.isdigit())
+    if price_digits:
+        return f"{int(price_digits)} ₽"
+    return NO_PRICE
+
+
+class _Capture:
+    __slots__ = ('tag', 'depth', 'parts')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.depth = 1
+        self.parts = []
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+class CardStreamParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.completed = []
+        self._card = None
+        self._card_depth = 0
+        self._item = None
+        self._title = None
+        self._value = None
+        self._item_title = None
+        self._item_value = None
+        self._price = None
+        self._alt_price = None
+        self._price_text = None
+        self._alt_price_text = None
+
+    def _start_card(self):
+        self._card = []
+        self._card_depth = 1
+        self._price_text = None
+        self._alt_price_text = None
+
+    def _finish_card(self):
+        card_data = {}
+        for key, val in self._card:
+            if 'Процессор' in key:
+                card_data['cpu'] = val
+            elif 'Видеокарта' in key:
+                card_data['gpu'] = val
+            elif 'Оперативная память' in key:
+                card_data['ram'] = val
+
+        if self._price_text is not None:
+            card_data['price'] = format_price(self._price_text.strip())
+        elif self._alt_price_text is not None:
+            card_data['price'] = format_price(self._alt_price_text.strip())
+        else:
+            card_data['price'] = NO_PRICE
+
+        self.completed.append(card_data)
+        self._card = None
+        self._item = self._title = self._value = None
+        self._price = self._alt_price = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+
+        if self._card is None:
+            if tag == 'div' and CARD_CLASS_MARKER in _class_string(attrs):
+                self._start_card()
+            return
+
+        for capture in (self._item, self._title, self._value, self._price, self._alt_price):
+            if capture is not None and capture.tag == tag:
+                capture.depth += 1
+        if tag == 'div':
+            self._card_depth += 1
+
+        class_string = _class_string(attrs)
+        if tag == 'li' and self._item is None and _has_class(class_string, 'card__system__item'):
+            self._item = _Capture('li')
+            self._item_title = None
+            self._item_value = None
+        elif tag == 'span' and self._item is not None:
+            if self._item_title is None and self._title is None and _has_class(class_string, 'card__system__title'):
+                self._title = _Capture('span')
+            elif self._item_value is None and self._value is None and _has_class(class_string, 'card__system__value'):
+                self._value = _Capture('span')
+        elif tag == 'div':
+            if self._price_text is None and self._price is None and _has_class(class_string, 'card__price'):
+                self._price = _Capture('div')
+            elif self._alt_price_text is None and self._alt_price is None and _has_class(class_string, 'price'):
+                self._alt_price = _Capture('div')
+
+    def handle_endtag(self, tag):
+        if self._card is None or tag in VOID_TAGS:
+            return
+
+        if self._title is not None and self._title.tag == tag:
+            self._title.depth -= 1
+            if self._title.depth == 0:
+                self._item_title = self._title.text()
+                self._title = None
+        if self._value is not None and self._value.tag == tag:
+            self._value.depth -= 1
+            if self._value.depth == 0:
+                self._item_value = self._value.text()
+                self._value = None
+        if self._item is not None and self._item.tag == tag:
+            self._item.depth -= 1
+            if self._item.depth == 0:
+                if self._item_title is not None and self._item_value is not None:
+                    key = self._item_title.replace(':', '').strip()
+                    self._card.append((key, self._item_value.strip()))
+                self._item = None
+        if self._price is not None and self._price.tag == tag:
+            self._price.depth -= 1
+            if self._price.depth == 0:
+                self._price_text = self._price.text()
+                self._price = None
+        if self._alt_price is not None and self._alt_price.tag == tag:
+            self._alt_price.depth -= 1
+            if self._alt_price.depth == 0:
+                self._alt_price_text = self._alt_price.text()
+                self._alt_price = None
+
+        if tag == 'div':
+            self._card_depth -= 1
+            if self._card_depth == 0:
+                self._finish_card()
+
+    def handle_data(self, data):
+        if self._card is None:
+            return
+        for capture in (self._title, self._value, self._price, self._alt_price):
+            if capture is not None:
+                capture.parts.append(data)
+
+    def close(self):
+        super().close()
+        if self._card is not None:
+            # unterminated last card: keep what we have, like a lenient tree builder would
+            self._finish_card()
+
+    def drain(self):
+        completed = self.completed
+        self.completed = []
+        return completed
+
+
+def iter_cards(chunks):
+    parser = CardStreamParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.drain()
+    parser.close()
+    yield from parser.drain()
+
+
+def iter_file_chunks(filepath, chunk_size=CHUNK_SIZE):
+    with open(filepath, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_cards_from_file(filepath, chunk_size=CHUNK_SIZE):
+    return iter_cards(iter_file_chunks(filepath, chunk_size))
+
+
+def _card_block(block, class_id):
+    if not class_id:
+        match = DATA_COMPUTER_RE.search(block)
+        class_id = match.group(1) if match else ''
+    return class_id, block
+
+
+def iter_card_blocks(chunks):
+    # Splits the page into raw per-card markup without tokenizing it. Each block
+    # runs from one card's opening tag to the next one (or the end of the page).
+    buffer = ''
+    current_id = None
+    for chunk in chunks:
+        buffer += chunk
+        block_start = 0
+        for match in CARD_START_RE.finditer(buffer, 1 if current_id is not None else 0):
+            if current_id is not None:
+                yield _card_block(buffer[block_start:match.start()], current_id)
+            current_id = match.group(1)
+            block_start = match.start()
+        buffer = buffer[block_start:]
+        if current_id is None and len(buffer) > BLOCK_PREFIX_KEEP:
+            buffer = buffer[-BLOCK_PREFIX_KEEP:]
+    if current_id is not None:
+        yield _card_block(buffer, current_id)
@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+MAX_PENDING_CHATS = 10000
+STEP_TTL = 15 * 60
+SWEEP_EVERY = 100
+
+PendingStep = namedtuple('PendingStep', ['step', 'version', 'expires_at'])
+
+
+class ConversationStates:
+    # What each chat was asked to reply to: a step name and the dataset version
+    # it was asked under, nothing else. The reply is resolved against the current
+    # snapshot, so a chat that never answers pins a few dozen bytes, not a dataset.
+    def __init__(self, max_chats=MAX_PENDING_CHATS, ttl=STEP_TTL, clock=time.monotonic):
+        self.max_chats = max_chats
+        self.ttl = ttl
+        self._clock = clock
+        self._steps = OrderedDict()
+        self._lock = threading.Lock()
+        self._sets = 0
+
+    def set(self, chat_id, step, version):
+        with self._lock:
+            self._sets += 1
+            if self._sets % SWEEP_EVERY == 0:
+                self._evict_expired()
+            self._steps.pop(chat_id, None)
+            self._steps[chat_id] = PendingStep(step, version, self._clock() + self.ttl)
+            while len(self._steps) > self.max_chats:
+                self._steps.popitem(last=False)
+
+    def pop(self, chat_id):
+        with self._lock:
+            pending = self._steps.pop(chat_id, None)
+        if pending is None or pending.expires_at < self._clock():
+            return None
+        return pending
+
+    def clear(self, chat_id):
+        with self._lock:
+            self._steps.pop(chat_id, None)
+
+    def evict_expired(self):
+        with self._lock:
+            self._evict_expired()
+
+    def _evict_expired(self):
+        # insertion order is expiry order, so expired steps sit at the front
+        now = self._clock()
+        while self._steps:
+            chat_id, pending = next(iter(self._steps.items()))
+            if pending.expires_at >= now:
+                break
+            del self._steps[chat_id]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._steps)
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from aggregates import build_aggregates
+from ai_summary import build_ai_summary
+from metrics import metrics
+from name_index import NameIndex
+from range_query import RangeIndex
+from records import build_records
+from search_index import SearchIndex
+from snapshot_file import load_snapshot, save_snapshot
+
+REFRESH_INTERVAL = 5
+
+DatasetSnapshot = namedtuple('DatasetSnapshot', ['version', 'cards', 'aggregates', 'search_index', 'range_index', 'name_index', 'ai_summary', 'hashes', 'fingerprint'])
+
+
+def file_stat_key(filepath):
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def file_content_hash(filepath, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    try:
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(hashes, state=None):
+    # stable across restarts, unlike the version counter
+    digest = hashlib.sha256()
+    for filepath in sorted(hashes):
+        digest.update(f"{filepath}={hashes[filepath]}\n".encode('utf-8'))
+    if state is not None:
+        digest.update(json.dumps(state, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class DatasetStore:
+    # source_state: optional callable describing what the loader reads besides
+    # source_files (storage backend, database revision); a JSON-serialisable
+    # value that is part of the snapshot key and checked like the files
+    def __init__(self, loader, source_files, snapshot_path=None, source_state=None):
+        self._loader = loader
+        self._source_files = tuple(source_files)
+        self._snapshot_path = snapshot_path
+        self._source_state = source_state
+        self._state = None
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stat_keys = {}
+        self._hashes = {}
+        self._background = False
+
+    def snapshot(self):
+        # with a DatasetRefresher running this is a single attribute read:
+        # no stat() calls, no lock, no reload on the request path
+        current = self._snapshot
+        if current is not None and (self._background or not self._sources_changed()):
+            return current
+
+        with self._lock:
+            current = self._snapshot
+            if current is not None and not self._sources_changed():
+                return current
+            return self._reload(current)
+
+    def refresh(self):
+        # rebuilds when the sources changed; True if a new snapshot was published
+        with self._lock:
+            current = self._snapshot
+            if current is not None and not self._sources_changed():
+                return False
+            return self._reload(current) is not current
+
+    def invalidate(self):
+        with self._lock:
+            self._stat_keys = {}
+            self._hashes = {}
+            self._state = None
+
+    def _current_state(self):
+        return self._source_state() if self._source_state is not None else None
+
+    def _source_key(self):
+        return {'files': self._hashes, 'state': self._state}
+
+    def _sources_changed(self):
+        if self._current_state() != self._state:
+            return True
+        for filepath in self._source_files:
+            if file_stat_key(filepath) != self._stat_keys.get(filepath):
+                return self._hashes_changed()
+        return False
+
+    def _hashes_changed(self):
+        changed = False
+        for filepath in self._source_files:
+            stat_key = file_stat_key(filepath)
+            if stat_key == self._stat_keys.get(filepath):
+                continue
+            content_hash = file_content_hash(filepath)
+            if content_hash != self._hashes.get(filepath):
+                changed = True
+            else:
+                # touched but not modified: remember the new mtime, keep the snapshot
+                self._stat_keys[filepath] = stat_key
+        return changed
+
+    def _reload(self, previous):
+        if previous is None and self._snapshot_path:
+            with metrics.timer('fogplay_stage_seconds', stage='snapshot_load'):
+                snapshot = self._load_from_file()
+            if snapshot is not None:
+                return snapshot
+
+        try:
+            with metrics.timer('fogplay_stage_seconds', stage='load'):
+                cards = self._loader()
+        except Exception as e:
+            logging.error(f"Error reloading dataset: {e}")
+            if previous is not None:
+                return previous
+            raise
+
+        # the loader may rewrite its own sources (cards_data.json), so fingerprint afterwards
+        self._remember_sources()
+
+        with metrics.timer('fogplay_stage_seconds', stage='records'):
+            records = build_records(cards or [])
+        with metrics.timer('fogplay_stage_seconds', stage='search_index'):
+            search_index = SearchIndex(records)
+        with metrics.timer('fogplay_stage_seconds', stage='range_index'):
+            range_index = RangeIndex(records)
+        if self._snapshot_path:
+            try:
+                with metrics.timer('fogplay_stage_seconds', stage='snapshot_save'):
+                    save_snapshot(self._snapshot_path, records, search_index, range_index, self._source_key())
+            except OSError as e:
+                print(f"Не удалось сохранить снимок {self._snapshot_path}: {e}")
+        return self._publish(previous, records, search_index, range_index)
+
+    def _load_from_file(self):
+        # cold start: skip the loader entirely while the sources still match the snapshot
+        hashes = {filepath: file_content_hash(filepath) for filepath in self._source_files}
+        state = self._current_state()
+        loaded = load_snapshot(self._snapshot_path, {'files': hashes, 'state': state})
+        if loaded is None:
+            return None
+        for filepath in self._source_files:
+            self._stat_keys[filepath] = file_stat_key(filepath)
+        self._hashes.update(hashes)
+        self._state = state
+        records, search_index, range_index = loaded
+        print(f"Набор данных загружен из снимка {self._snapshot_path}")
+        return self._publish(None, records, search_index, range_index)
+
+    def _remember_sources(self):
+        for filepath in self._source_files:
+            self._stat_keys[filepath] = file_stat_key(filepath)
+            self._hashes[filepath] = file_content_hash(filepath)
+        self._state = self._current_state()
+
+    def _publish(self, previous, records, search_index, range_index):
+        version = previous.version + 1 if previous is not None else 1
+        with metrics.timer('fogplay_stage_seconds', stage='aggregates'):
+            if previous is not None:
+                aggregates = build_aggregates(records, previous.cards, previous.aggregates)
+            else:
+                aggregates = build_aggregates(records)
+        with metrics.timer('fogplay_stage_seconds', stage='name_index'):
+            name_index = NameIndex(records)
+        with metrics.timer('fogplay_stage_seconds', stage='ai_summary'):
+            ai_summary = build_ai_summary(records, aggregates)
+        snapshot = DatasetSnapshot(
+            version, records, aggregates, search_index, range_index, name_index,
+            ai_summary, MappingProxyType(dict(self._hashes)), dataset_fingerprint(self._hashes, self._state)
+        )
+        self._snapshot = snapshot
+        print(f"Набор данных обновлён: версия {version}, {len(snapshot.cards)} карточек")
+        return snapshot
+
+
+class DatasetRefresher:
+    # Keeps the dataset fresh from its own thread: checks the sources every
+    # `interval` seconds and, if `fetch` is given (e.g. the scraper), runs it
+    # every `fetch_interval` first. The new snapshot is built completely and
+    # then published with one reference assignment, so handlers keep reading
+    # the old immutable one until then and never wait for a rebuild.
+    def __init__(self, store, interval=REFRESH_INTERVAL, fetch=None, fetch_interval=None, clock=time.monotonic):
+        self.store = store
+        self.interval = interval
+        self.fetch = fetch
+        self.fetch_interval = fetch_interval
+        self.last_duration = None
+        self._clock = clock
+        self._stopping = threading.Event()
+        self._thread = None
+        self._next_fetch = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.store._background = True
+        self._next_fetch = self._clock() if self.fetch else None
+        self._thread = threading.Thread(target=self._run, name='dataset-refresh', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.run_once()
+            self._stopping.wait(self.interval)
+
+    def run_once(self):
+        if self._next_fetch is not None and self._clock() >= self._next_fetch:
+            self._next_fetch = self._clock() + self.fetch_interval
+            try:
+                self.fetch()
+            except Exception as e:
+                logging.error(f"Dataset fetch failed: {e}")
+
+        started = time.perf_counter()
+        try:
+            published = self.store.refresh()
+        except Exception as e:
+            metrics.inc('fogplay_refresh_total', result='failed')
+            logging.error(f"Background dataset refresh failed: {e}")
+            return False
+        if not published:
+            return False
+        self.last_duration = time.perf_counter() - started
+        metrics.observe('fogplay_refresh_seconds', self.last_duration)
+        metrics.inc('fogplay_refresh_total', result='published')
+        print(f"Набор данных перестроен в фоне за {self.last_duration:.2f} с")
+        return True
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.store._background = False
@@ -0,0 +1,183 @@
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+FAKE_BOT_USER = {'id': 1000, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+
+
+class FakeBotAPI:
+    # Local stand-in for api.telegram.org (point TELEGRAM_API_URL at api_url):
+    # answers the Bot API methods the bot uses, records every call, feeds queued
+    # updates to getUpdates and can emulate Telegram's flood limits with 429s.
+    def __init__(self, host='127.0.0.1', port=0, chat_limit=None, global_limit=None,
+                 retry_after=1, latency=0.0, clock=time.monotonic):
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.retry_after = retry_after
+        self.latency = latency
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._updates_ready = threading.Condition(self._lock)
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._recent = deque()
+        self.calls = []
+        self.rejected = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-bot-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def calls_to(self, method):
+        with self._lock:
+            return [params for name, params in self.calls if name == method]
+
+    def push_update(self, update):
+        with self._lock:
+            update = dict(update, update_id=next(self._update_ids))
+            self._updates.append(update)
+            self._updates_ready.notify_all()
+        return update
+
+    def push_message(self, chat_id, text, user_id=None):
+        return self.push_update({'message': {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': user_id or chat_id, 'is_bot': False, 'first_name': 'User'},
+            'text': text,
+        }})
+
+    def push_callback(self, chat_id, data, message_id=1, user_id=None):
+        user = {'id': user_id or chat_id, 'is_bot': False, 'first_name': 'User'}
+        return self.push_update({'callback_query': {
+            'id': str(next(self._update_ids)),
+            'from': user,
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': FAKE_BOT_USER,
+                'text': 'menu',
+            },
+        }})
+
+    def push_inline_query(self, user_id, query, offset=''):
+        return self.push_update({'inline_query': {
+            'id': str(next(self._update_ids)),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'},
+            'query': query,
+            'offset': offset,
+        }})
+
+    def _flooded(self, chat_id):
+        now = self._clock()
+        while self._recent and now - self._recent[0][0] >= 1:
+            self._recent.popleft()
+        if self.global_limit is not None and len(self._recent) >= self.global_limit:
+            return True
+        if self.chat_limit is not None and chat_id is not None:
+            if sum(1 for _, recent_chat in self._recent if recent_chat == chat_id) >= self.chat_limit:
+                return True
+        self._recent.append((now, chat_id))
+        return False
+
+    def _message(self, params):
+        return {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': int(params['chat_id']), 'type': 'private'},
+            'from': FAKE_BOT_USER,
+            'text': params.get('text', ''),
+        }
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        deadline = self._clock() + timeout
+        with self._lock:
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates and self._clock() < deadline:
+                self._updates_ready.wait(deadline - self._clock())
+            return list(self._updates)
+
+    def handle(self, method, params):
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self._get_updates(params)}
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls.append((method, params))
+            chat_id = params.get('chat_id')
+            if method in ('sendMessage', 'editMessageText') and self._flooded(chat_id):
+                self.rejected += 1
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f"Too Many Requests: retry after {self.retry_after}",
+                    'parameters': {'retry_after': self.retry_after},
+                }
+
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': FAKE_BOT_USER}
+        if method in ('sendMessage', 'editMessageText'):
+            return 200, {'ok': True, 'result': self._message(params)}
+        if method == 'answerInlineQuery':
+            if not params.get('inline_query_id'):
+                return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: query is too old'}
+            return 200, {'ok': True, 'result': True}
+        if method in ('answerCallbackQuery', 'deleteMessage', 'setWebhook', 'deleteWebhook'):
+            return 200, {'ok': True, 'result': True}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not emulated'}
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit('/', 1)[-1]
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    body = self.rfile.read(length).decode('utf-8')
+                    if self.headers.get('Content-Type', '').startswith('application/json'):
+                        params.update(json.loads(body))
+                    else:
+                        params.update(parse_qsl(body))
+                status, payload = api.handle(method, params)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from card_parser import iter_card_blocks, iter_file_chunks
+
+PAGE_SIZE = 50
+
+
+class FakeFogplaySite:
+    # Local stand-in for the fogplay listing (point scraper.py --url at url):
+    # serves a saved dump split into "?page=N" pages linked by pagination__next,
+    # with ETag/Last-Modified validators and 304 answers.
+    def __init__(self, dump='cards.txt', page_size=PAGE_SIZE, host='127.0.0.1', port=0, latency=0.0):
+        blocks = [block for _, block in iter_card_blocks(iter_file_chunks(dump))]
+        self.pages = [blocks[start:start + page_size] for start in range(0, len(blocks), page_size)]
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._modified = [time.time()] * len(self.pages)
+        self.requests = []
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='fake-fogplay', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def replace_page(self, number, blocks):
+        with self._lock:
+            self.pages[number - 1] = list(blocks)
+            # validators have one-second resolution on the wire
+            self._modified[number - 1] = max(time.time(), self._modified[number - 1] + 1)
+
+    def statuses(self):
+        with self._lock:
+            return [status for _, status in self.requests]
+
+    def render(self, number):
+        nav = ''
+        if number < len(self.pages):
+            nav = f'<div class="pagination"><a class="pagination__next" href="/?page={number + 1}">Далее</a></div>'
+        return (
+            '<html><body><div id="servers"><div id="servers_grid" class="grid infinite-scroll">'
+            + ''.join(self.pages[number - 1])
+            + f'</div>{nav}</div></body></html>'
+        )
+
+    def _handler_class(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                number = int(parse_qs(url.query).get('page', ['1'])[0])
+                with site._lock:
+                    if url.path != '/' or not 1 <= number <= len(site.pages):
+                        site.requests.append((self.path, 404))
+                        self.send_error(404)
+                        return
+                    body = site.render(number).encode('utf-8')
+                    modified = int(site._modified[number - 1])
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+                status = 200
+                if self.headers.get('If-None-Match'):
+                    if self.headers['If-None-Match'] == etag:
+                        status = 304
+                elif self.headers.get('If-Modified-Since'):
+                    try:
+                        if parsedate_to_datetime(self.headers['If-Modified-Since']).timestamp() >= modified:
+                            status = 304
+                    except (TypeError, ValueError):
+                        pass
+                with site._lock:
+                    site.requests.append((self.path, status))
+                if site.latency:
+                    time.sleep(site.latency)
+
+                self.send_response(status)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', formatdate(modified, usegmt=True))
+                if status == 304:
+                    self.end_headers()
+                    return
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,38 @@
+import threading
+import time
+from collections import namedtuple
+
+FakeResponse = namedtuple('FakeResponse', ['text'])
+
+
+def default_responder(prompt):
+    return f"Тестовый ответ AI ({len(prompt)} символов в запросе)"
+
+
+class FakeChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content):
+        with self.model.lock:
+            self.model.calls += 1
+        if self.model.delay:
+            time.sleep(self.model.delay)
+        text = self.model.responder(content)
+        self.history.append({'role': 'user', 'parts': [content]})
+        self.history.append({'role': 'model', 'parts': [text]})
+        return FakeResponse(text)
+
+
+class FakeGenerativeModel:
+    # Offline stand-in for genai.GenerativeModel (GEMINI_FAKE=1): same
+    # start_chat/send_message surface, fixed latency, counts calls.
+    def __init__(self, delay=0.5, responder=default_responder):
+        self.delay = delay
+        self.responder = responder
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
@@ -0,0 +1,260 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from card_parser import iter_card_blocks, iter_cards, iter_file_chunks
+from dataset import file_content_hash
+from metrics import metrics
+
+CARDS_BY_ID_FILE = 'cards_by_id.json'
+CHECKPOINT_FILE = 'cards_checkpoint.json'
+LEGACY_JSON_FILE = 'cards_data.json'
+DUMP_EXTENSIONS = ('.txt', '.html', '.htm')
+
+# ping values are re-measured on every page load and say nothing about the machine
+VOLATILE_MARKUP_RE = re.compile(r'<div class="ping__value[^"]*"[^>]*>[^<]*</div>')
+
+IngestReport = namedtuple(
+    'IngestReport',
+    ['added', 'updated', 'removed', 'unchanged', 'parsed', 'duplicates', 'skipped'],
+)
+
+DumpResult = namedtuple('DumpResult', ['path', 'cards', 'duplicates', 'size', 'seconds'])
+
+
+def block_hash(block):
+    normalized = VOLATILE_MARKUP_RE.sub('', block)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def read_json(filepath, default):
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        print(f"Ошибка при чтении {filepath}: {e}")
+        return default
+
+
+def write_json_atomic(filepath, data, indent=None):
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def generate_card_key(card):
+    cpu = card.get('cpu', '').lower().strip()
+    gpu = card.get('gpu', '').lower().strip()
+    ram = card.get('ram', '').lower().strip()
+    cpu = ' '.join(cpu.split())
+    gpu = ' '.join(gpu.split())
+    ram = ' '.join(ram.split())
+    return f"{cpu}|{gpu}|{ram}"
+
+
+def merge_by_config(existing_data, new_cards):
+    # appends configurations not seen yet; returns (added, duplicates)
+    existing_configs = {generate_card_key(card) for card in existing_data}
+    added_count = 0
+    duplicate_count = 0
+    for card in new_cards:
+        card_key = generate_card_key(card)
+        if card_key not in existing_configs:
+            existing_data.append(card)
+            existing_configs.add(card_key)
+            added_count += 1
+        else:
+            duplicate_count += 1
+    return added_count, duplicate_count
+
+
+def load_cards_by_id(store_path=CARDS_BY_ID_FILE):
+    return read_json(store_path, {})
+
+
+def ingest_cards(html_path, store_path=CARDS_BY_ID_FILE, checkpoint_path=CHECKPOINT_FILE, history=None):
+    # history: optional PriceHistory that gets one observation per changed dump
+    cards_by_id = load_cards_by_id(store_path)
+    checkpoint = read_json(checkpoint_path, {})
+    card_hashes = checkpoint.get('cards', {})
+
+    file_hash = file_content_hash(html_path)
+    if file_hash is None:
+        print(f"Файл не найден: {html_path}")
+        return cards_by_id, IngestReport(0, 0, 0, len(cards_by_id), 0, 0, True)
+
+    if file_hash == checkpoint.get('file_hash') and os.path.exists(store_path):
+        return cards_by_id, IngestReport(0, 0, 0, len(cards_by_id), 0, 0, True)
+
+    started = time.perf_counter()
+    added = updated = unchanged = parsed = duplicates = 0
+    seen_hashes = {}
+
+    for computer_id, block in iter_card_blocks(iter_file_chunks(html_path)):
+        if not computer_id:
+            continue
+        if computer_id in seen_hashes:
+            # the infinite-scroll dump repeats some machines across pages; first one wins
+            duplicates += 1
+            continue
+
+        content_hash = block_hash(block)
+        seen_hashes[computer_id] = content_hash
+        if card_hashes.get(computer_id) == content_hash and computer_id in cards_by_id:
+            unchanged += 1
+            continue
+
+        parsed += 1
+        card = next(iter_cards([block]), None)
+        if card is None:
+            continue
+
+        previous = cards_by_id.get(computer_id)
+        if previous is None:
+            added += 1
+        elif previous != card:
+            updated += 1
+        else:
+            unchanged += 1
+        cards_by_id[computer_id] = card
+
+    removed_ids = [computer_id for computer_id in cards_by_id if computer_id not in seen_hashes]
+    for computer_id in removed_ids:
+        del cards_by_id[computer_id]
+
+    if added or updated or removed_ids or not os.path.exists(store_path):
+        write_json_atomic(store_path, cards_by_id, indent=2)
+    write_json_atomic(checkpoint_path, {'file_hash': file_hash, 'cards': seen_hashes})
+    if history is not None:
+        # the dump's mtime is when the page was saved, not when we got to it
+        history.record(cards_by_id, os.path.getmtime(html_path))
+
+    report = IngestReport(added, updated, len(removed_ids), unchanged, parsed, duplicates, False)
+    metrics.observe('fogplay_stage_seconds', time.perf_counter() - started, stage='ingest')
+    metrics.inc('fogplay_ingest_cards_total', parsed, result='parsed')
+    metrics.inc('fogplay_ingest_cards_total', unchanged, result='unchanged')
+    print(
+        f"Инжест {html_path}: добавлено {report.added}, обновлено {report.updated}, "
+        f"удалено {report.removed}, без изменений {report.unchanged}, "
+        f"разобрано {report.parsed}, повторов {report.duplicates}"
+    )
+    return cards_by_id, report
+
+
+def expand_dump_paths(patterns):
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for name in os.listdir(pattern):
+                if name.lower().endswith(DUMP_EXTENSIONS):
+                    paths.add(os.path.join(pattern, name))
+        else:
+            paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    # sorted so the first-one-wins merge does not depend on the file system
+    return sorted(paths)
+
+
+def parse_dump(path):
+    started = time.perf_counter()
+    cards = []
+    seen_ids = set()
+    duplicates = 0
+    for computer_id, block in iter_card_blocks(iter_file_chunks(path)):
+        if not computer_id:
+            continue
+        if computer_id in seen_ids:
+            duplicates += 1
+            continue
+        seen_ids.add(computer_id)
+        card = next(iter_cards([block]), None)
+        if card is not None:
+            cards.append((computer_id, card))
+    return DumpResult(path, cards, duplicates, os.path.getsize(path), time.perf_counter() - started)
+
+
+def ingest_dumps(paths, workers=None):
+    # parses the dumps in a process pool and merges them in path order: a machine
+    # seen in several dumps keeps the card from the first one, as within one dump
+    started = time.perf_counter()
+    cards_by_id = {}
+    duplicates = 0
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(parse_dump, paths):
+            results.append(result)
+            duplicates += result.duplicates
+            for computer_id, card in result.cards:
+                if computer_id in cards_by_id:
+                    duplicates += 1
+                else:
+                    cards_by_id[computer_id] = card
+            print(
+                f"{result.path}: {len(result.cards)} карточек, {result.seconds:.2f} с, "
+                f"{result.size / (1 << 20) / max(result.seconds, 1e-9):.1f} МБ/с"
+            )
+
+    wall = time.perf_counter() - started
+    total_size = sum(result.size for result in results)
+    busy = sum(result.seconds for result in results)
+    print(
+        f"Разобрано {len(results)} файлов ({total_size / (1 << 20):.1f} МБ) за {wall:.2f} с: "
+        f"{total_size / (1 << 20) / max(wall, 1e-9):.1f} МБ/с, "
+        f"{sum(len(result.cards) for result in results) / max(wall, 1e-9):.0f} карточек/с, "
+        f"ускорение x{busy / max(wall, 1e-9):.1f}; "
+        f"уникальных компьютеров {len(cards_by_id)}, повторов {duplicates}"
+    )
+    return cards_by_id, results
+
+
+def merge_dumps_into_json(cards_by_id, json_path=LEGACY_JSON_FILE):
+    existing_data = read_json(json_path, [])
+    added_count, duplicate_count = merge_by_config(existing_data, cards_by_id.values())
+    if added_count:
+        write_json_atomic(json_path, existing_data, indent=2)
+    print(f"{json_path}: добавлено {added_count} новых конфигураций, пропущено {duplicate_count} дубликатов")
+    return added_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Инкрементальный импорт карточек fogplay по ID компьютера")
+    parser.add_argument('html_path', nargs='?', default='cards.txt')
+    parser.add_argument('--store', default=CARDS_BY_ID_FILE)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE)
+    parser.add_argument('--history', default='price_history.json', help="история цен; пустая строка отключает")
+    parser.add_argument('--dumps', nargs='+', metavar='PATH',
+                        help="каталоги или glob-шаблоны с дампами страниц; разбираются параллельно")
+    parser.add_argument('--workers', type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument('--json', default=LEGACY_JSON_FILE, help="куда добавить новые конфигурации из дампов")
+    args = parser.parse_args()
+
+    if args.dumps:
+        paths = expand_dump_paths(args.dumps)
+        if not paths:
+            print("Дампы не найдены")
+            return
+        cards_by_id, _ = ingest_dumps(paths, args.workers)
+        merge_dumps_into_json(cards_by_id, args.json)
+        return
+
+    history = None
+    if args.history:
+        from price_history import PriceHistory
+        history = PriceHistory(args.history)
+    cards_by_id, report = ingest_cards(args.html_path, args.store, args.checkpoint, history)
+    if report.skipped:
+        print(f"{args.html_path} не изменился, карточек в хранилище: {len(cards_by_id)}")
+
+
+if __name__ == '__main__':
+    main()
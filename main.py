@@ -1,13 +1,31 @@
 import requests
-from bs4 import BeautifulSoup
 import telebot
 from dotenv import load_dotenv
 import os
-from collections import Counter
 import json
 import google.generativeai as genai
 import logging
-import asyncio
+import html
+import signal
+from ai_cache import AIResponseCache
+from ai_runtime import AIBusyError, AIRuntime
+from ai_sessions import ChatSessionPool, history_text
+from ai_summary import estimate_tokens
+from dataset import REFRESH_INTERVAL, DatasetRefresher, DatasetStore
+from fake_genai import FakeGenerativeModel
+from bot_runtime import HANDLER_WORKERS as DEFAULT_HANDLER_WORKERS, BotRuntime
+from card_parser import iter_cards
+from conversation_state import ConversationStates
+from metrics import instrument_methods, metrics, start_http_server
+from ingest import generate_card_key, ingest_cards, merge_by_config
+from price_history import DEFAULT_TREND_DAYS, PRICE_HISTORY_FILE, PriceHistory
+from range_query import RangeQueryError, parse_range_query
+from render_cache import RenderCache, ShownMessages, content_digest
+from result_pages import PAGE_SIZE, ResultCache
+from scraper import FOGPLAY_URL, scrape
+from send_queue import SendQueue
+from snapshot_file import DATASET_SNAPSHOT_FILE
+from storage_sqlite import CARDS_DB_FILE, SEARCHABLE_FIELDS, SQLiteCardStore
 
 load_dotenv()
 
@@ -15,7 +33,29 @@ BOT_TOKEN = os.getenv("ТОКЕН БОТА")
 if not BOT_TOKEN:
     BOT_TOKEN = 'ТОКЕН БОТА'
 
-bot = telebot.TeleBot(BOT_TOKEN)
+# TELEGRAM_API_URL points the bot at another Bot API server (e.g. fake_bot_api.py)
+if os.getenv("TELEGRAM_API_URL"):
+    telebot.apihelper.API_URL = os.getenv("TELEGRAM_API_URL")
+
+# handlers run on BotRuntime's worker pool, not telebot's own threads
+bot = telebot.TeleBot(BOT_TOKEN, threaded=False)
+
+# WEBHOOK_URL switches from long polling to a webhook served on WEBHOOK_HOST:WEBHOOK_PORT
+HANDLER_WORKERS = int(os.getenv("HANDLER_WORKERS", DEFAULT_HANDLER_WORKERS))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+SHUTDOWN_TIMEOUT = int(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+
+# METRICS_ENABLED=1 turns instrumentation on; METRICS_PORT also serves /metrics over HTTP
+METRICS_PORT = os.getenv("METRICS_PORT")
+if os.getenv("METRICS_ENABLED") or METRICS_PORT:
+    metrics.enable()
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(',') if user_id.strip()}
+TELEGRAM_METHODS = ['send_message', 'reply_to', 'edit_message_text', 'answer_callback_query', 'delete_message',
+                    'answer_inline_query']
+instrument_methods(bot, TELEGRAM_METHODS, 'fogplay_telegram_seconds', 'fogplay_telegram_errors_total')
 
 GEMINI_API_KEY = os.getenv("ТУТ АПИ")
 if not GEMINI_API_KEY:
@@ -30,173 +70,179 @@ generation_config = {
     "max_output_tokens": 8192,
 }
 
-model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash-exp",
-    generation_config=generation_config
-)
+if os.getenv("GEMINI_FAKE"):
+    model = FakeGenerativeModel()
+else:
+    model = genai.GenerativeModel(
+        model_name="gemini-2.0-flash-exp",
+        generation_config=generation_config
+    )
 
-chat_sessions = {}
+chat_sessions = ChatSessionPool()
 
-def load_html_from_file(filepath):
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        print(f"Файл не найден: {filepath}")
-        return None
-    except Exception as e:
-        print(f"Ошибка при чтении файла: {e}")
-        return None
+ai_runtime = AIRuntime()
 
-def parse_html_cards_simplified(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    cards = soup.find_all('div', class_=lambda x: x and 'card card-outside computer-' in x)
-    print(f"Найдено карточек: {len(cards)}")
+AI_CACHE_FILE = os.getenv("AI_CACHE_FILE", "ai_cache.json")
+ai_cache = AIResponseCache(disk_path=AI_CACHE_FILE or None)
 
-    card_data_list = []
-    for card in cards:
-        try:
-            card_data = {}
-            
-            system_items = card.find_all('li', class_='card__system__item')
-            for item in system_items:
-                title = item.find('span', class_='card__system__title')
-                value = item.find('span', class_='card__system__value')
-                if title and value:
-                    key = title.text.replace(':', '').strip()
-                    val = value.text.strip()
-                    if 'Процессор' in key:
-                        card_data['cpu'] = val
-                    elif 'Видеокарта' in key:
-                        card_data['gpu'] = val
-                    elif 'Оперативная память' in key:
-                        card_data['ram'] = val
-
-            price_element = card.find('div', class_='card__price')
-            if price_element:
-                price_text = price_element.text.strip()
-                price_digits = ''.join(c for c in price_text if c.isdigit())
-                if price_digits:
-                    card_data['price'] = f"{int(price_digits)} ₽"
-                else:
-                    card_data['price'] = "Цена не указана"
-            else:
-                alt_price = card.find('div', class_='price')
-                if alt_price:
-                    price_text = alt_price.text.strip()
-                    price_digits = ''.join(c for c in price_text if c.isdigit())
-                    if price_digits:
-                        card_data['price'] = f"{int(price_digits)} ₽"
-                    else:
-                        card_data['price'] = "Цена не указана"
-                else:
-                    card_data['price'] = "Цена не указана"
-
-            card_data_list.append(card_data)
-            print(f"Обработана карточка: {card_data}")  
-            
-        except Exception as e:
-            print(f"Ошибка при обработке карточки: {e}")
-            continue
+CARDS_HTML_FILE = 'cards.txt'
+CARDS_JSON_FILE = 'cards_data.json'
+
+# CARDS_STORAGE=sqlite keeps cards in CARDS_DB_FILE instead of cards_data.json
+CARDS_STORAGE = os.getenv("CARDS_STORAGE", "json")
+card_store = None
+
+price_history = PriceHistory(os.getenv("PRICE_HISTORY_FILE", PRICE_HISTORY_FILE))
+
+# parsed cards and indexes for a fast cold start; empty disables the snapshot
+SNAPSHOT_FILE = os.getenv("DATASET_SNAPSHOT_FILE", DATASET_SNAPSHOT_FILE)
+
+result_cache = ResultCache()
+
+# chats that were sent a ForceReply prompt, waiting for their answer
+conversation_states = ConversationStates()
+
+# inline mode (enable it for the bot in @BotFather with /setinline)
+INLINE_RESULTS = 20
+INLINE_CACHE_TIME = 60
+
+# replies that nothing waits on go through the rate-limited outbound queue
+outbox = SendQueue()
+
+stats_render_cache = RenderCache()
+shown_messages = ShownMessages()
+
+def edit_message(chat_id, message_id, text, parse_mode=None, reply_markup=None):
+    # returns False when the message already shows exactly this content
+    digest = content_digest(text, parse_mode, reply_markup)
+    if shown_messages.is_shown(chat_id, message_id, digest):
+        return False
+    try:
+        bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+    except telebot.apihelper.ApiTelegramException as e:
+        if 'message is not modified' not in str(e):
+            shown_messages.forget(chat_id, message_id)
+            raise
+    shown_messages.remember(chat_id, message_id, digest)
+    return True
 
+def parse_html_cards_simplified(html_content):
+    card_data_list = list(iter_cards([html_content]))
+    print(f"Найдено карточек: {len(card_data_list)}")
     return card_data_list
 
-def get_price_stats(card_data_list):
+def get_price_stats(aggregates):
     try:
-        prices = []
-        for card in card_data_list:
-            price_str = card['price'].replace('₽', '').replace(' ', '')
-            if price_str.isdigit():
-                prices.append(int(price_str))
+        prices = aggregates.prices
         
-        if not prices:
+        if not prices.total:
             return "❌ <b>Нет данных о ценах</b>"
         
-        avg_price = sum(prices) / len(prices)
-        median_price = sorted(prices)[len(prices)//2]
+        avg_price = prices.sum / prices.total
+        median_price = prices.median()
         
         return (
             "💰 <b>АНАЛИЗ ЦЕН</b>\n"
-            f"└ Всего с ценами: <b>{len(prices)}</b> из {len(card_data_list)}\n"
+            f"└ Всего с ценами: <b>{prices.total}</b> из {aggregates.total}\n"
             f"└ Средняя: <b>{int(avg_price):,} ₽</b>\n"
-            f"└ Минимальная: <b>{min(prices):,} ₽</b>\n"
-            f"└ Максимальная: <b>{max(prices):,} ₽</b>\n"
+            f"└ Минимальная: <b>{prices.min():,} ₽</b>\n"
+            f"└ Максимальная: <b>{prices.max():,} ₽</b>\n"
             f"└ Медианная: <b>{median_price:,} ₽</b>"
         )
     except Exception as e:
         print(f"Ошибка в get_price_stats: {e}")
         return "❌ <b>Ошибка при анализе цен</b>"
 
-def get_cpu_stats(card_data_list):
-    cpu_counts = Counter(card['cpu'] for card in card_data_list)
-    total = len(card_data_list)
+def get_cpu_stats(aggregates):
+    total = aggregates.total
     
     output = "🔧 <b>СТАТИСТИКА ПРОЦЕССОРОВ</b>\n"
-    for cpu, count in cpu_counts.most_common(5):
+    for cpu, count in aggregates.cpu_counts.most_common(5):
         percentage = (count / total) * 100
         output += f"└ {cpu}: {count} шт ({percentage:.1f}%)\n"
     return output
 
-def get_gpu_stats(card_data_list):
-    gpu_counts = Counter(card['gpu'] for card in card_data_list)
-    total = len(card_data_list)
+def get_gpu_stats(aggregates):
+    total = aggregates.total
     
     output = "🎮 <b>СТАТИСТИКА ВИДЕОКАРТ</b>\n"
-    for gpu, count in gpu_counts.most_common(5):
+    for gpu, count in aggregates.gpu_counts.most_common(5):
         percentage = (count / total) * 100
         output += f"└ {gpu}: {count} шт ({percentage:.1f}%)\n"
     return output
 
-def get_ram_stats(card_data_list):
-    ram_counts = Counter(card['ram'] for card in card_data_list)
-    total = len(card_data_list)
+def get_ram_stats(aggregates):
+    total = aggregates.total
     
     output = "💾 <b>СТАТИСТИКА ОЗУ</b>\n"
-    for ram, count in ram_counts.most_common():
+    for ram, count in aggregates.ram_counts.most_common():
         percentage = (count / total) * 100
         output += f"└ {ram}: {count} шт ({percentage:.1f}%)\n"
     return output
 
-def get_quick_overview(card_data_list):
-    total = len(card_data_list)
-    prices = [int(card['price'].replace('₽', '').replace(' ', '')) for card in card_data_list if card['price'].replace('₽', '').replace(' ', '').isdigit()]
-    avg_price = sum(prices) / len(prices) if prices else 0
+def get_quick_overview(aggregates):
+    prices = aggregates.prices
+    avg_price = prices.sum / prices.total if prices.total else 0
     
     return (
         "📊 <b>КРАТКИЙ ОБЗОР</b>\n"
-        f"└ Всего компьютеров: <b>{total}</b>\n"
+        f"└ Всего компьютеров: <b>{aggregates.total}</b>\n"
         f"└ Средняя цена: <b>{int(avg_price):,} ₽</b>\n"
-        f"└ Моделей CPU: <b>{len(set(card['cpu'] for card in card_data_list))}</b>\n"
-        f"└ Моделей GPU: <b>{len(set(card['gpu'] for card in card_data_list))}</b>"
+        f"└ Моделей CPU: <b>{len(aggregates.cpu_counts)}</b>\n"
+        f"└ Моделей GPU: <b>{len(aggregates.gpu_counts)}</b>"
+    )
+
+def get_price_trend(query, days=DEFAULT_TREND_DAYS):
+    trend = price_history.price_trend(query, days)
+    query = html.escape(query)
+    if not trend.matched:
+        return f"❌ <b>В истории нет компьютеров с «{query}»</b>"
+    if not trend.days:
+        return f"❌ <b>За {days} дней наблюдений не было</b>"
+    
+    first, last = trend.days[0], trend.days[-1]
+    output = f"📈 <b>ДИНАМИКА ЦЕН: {query}</b> ({days} дн.)\n"
+    for day in trend.days:
+        if day.median_price is None:
+            output += f"└ {day.date:%d.%m}: {day.available} шт, цена не указана\n"
+        else:
+            output += f"└ {day.date:%d.%m}: {day.available} шт, от {day.min_price:,} ₽, медиана {day.median_price:,} ₽\n"
+    if first.median_price is not None and last.median_price is not None and len(trend.days) > 1:
+        output += f"\nМедиана: {first.median_price:,} ₽ → <b>{last.median_price:,} ₽</b>"
+        output += f" ({last.median_price - first.median_price:+,} ₽)\n"
+    output += (
+        f"Изменений цены: <b>{trend.price_changes}</b>, "
+        f"появилось: <b>{trend.appeared}</b>, пропало: <b>{trend.disappeared}</b>"
     )
+    return output
 
-def generate_statistics(card_data_list):
+STATS_RENDERERS = {
+    'overview': get_quick_overview,
+    'prices': get_price_stats,
+    'cpu': get_cpu_stats,
+    'gpu': get_gpu_stats,
+    'ram': get_ram_stats,
+}
+
+def generate_statistics(aggregates):
     stats = {
-        'total_cards': len(card_data_list),
-        'prices': [],
-        'ram_sizes': [],
-        'cpu_counts': Counter(),
-        'gpu_counts': Counter()
+        'total_cards': aggregates.total,
+        'cpu_counts': aggregates.cpu_counts,
+        'gpu_counts': aggregates.gpu_counts,
+        'ram_counts': aggregates.ram_counts
     }
 
-    for card in card_data_list:
-        stats['cpu_counts'][card['cpu']] += 1
-        stats['gpu_counts'][card['gpu']] += 1
-        stats['ram_sizes'].append(card['ram'])
-        
-        try:
-            price_str = card['price'].replace('₽', '').replace(' ', '')
-            price = int(price_str) if price_str.isdigit() else 0
-            if price > 0:
-                stats['prices'].append(price)
-        except:
-            continue
-
-    if stats['prices']:
-        stats['avg_price'] = sum(stats['prices']) / len(stats['prices'])
-        stats['min_price'] = min(stats['prices'])
-        stats['max_price'] = max(stats['prices'])
+    positive_prices = aggregates.positive_prices()
+    if positive_prices:
+        stats['avg_price'] = positive_prices['avg']
+        stats['min_price'] = positive_prices['min']
+        stats['max_price'] = positive_prices['max']
 
     return stats
 
@@ -230,58 +276,96 @@ def format_stats_for_telegram(stats, card_data_list):
 
     return output
 
-def search_by_component(card_data_list, component_type, query):
-    results = []
-    query = query.lower()
-    
-    for card in card_data_list:
-        if component_type in card and query in card[component_type].lower():
-            results.append(card)
-    
-    return results
+def search_by_component(search_index, component_type, query):
+    if card_store is not None and component_type in SEARCHABLE_FIELDS:
+        return card_store.search(component_type, query)
+    return search_index.search_component(component_type, query)
 
-def format_config_results(results):
+def format_config_results(results, page=0, page_size=PAGE_SIZE):
     if not results:
         return "❌ Конфигурации не найдены"
     
-    output = f"🔍 Найдено конфигураций: {len(results)}\n\n"
-    for i, config in enumerate(results, 1):
+    page_count = max(1, -(-len(results) // page_size))
+    page = min(max(page, 0), page_count - 1)
+    start = page * page_size
+    
+    output = f"🔍 Найдено конфигураций: {len(results)}"
+    if page_count > 1:
+        output += f" (страница {page + 1} из {page_count})"
+    output += "\n\n"
+    for i, config in enumerate(results[start:start + page_size], start + 1):
         output += (f"📌 Конфигурация #{i}\n"
-                  f"└ CPU: {config['cpu']}\n"
-                  f"└ GPU: {config['gpu']}\n"
-                  f"└ RAM: {config['ram']}\n"
-                  f"└ Цена: {config['price']}\n\n")
-        
-        if len(output) > 3000:
-            output += "... и ещё несколько конфигураций"
-            break
+                  f"└ CPU: {config.cpu}\n"
+                  f"└ GPU: {config.gpu}\n"
+                  f"└ RAM: {config.ram}\n"
+                  f"└ Цена: {config.price}\n\n")
             
     return output
 
-def search_by_full_config(card_data_list, query):
-    results = []
-    query_parts = query.lower().split()
-    
-    for card in card_data_list:
-        card_text = (f"{card['cpu']} {card['gpu']} {card['ram']}").lower()
-        matches = sum(1 for part in query_parts if part in card_text)
-        if matches >= len(query_parts) / 2:
-            score = matches / len(query_parts)
-            results.append((score, card))
-    
-    return [card for score, card in sorted(results, key=lambda x: x[0], reverse=True)]
-
-def generate_card_key(card):
-    cpu = card.get('cpu', '').lower().strip()
-    gpu = card.get('gpu', '').lower().strip()
-    ram = card.get('ram', '').lower().strip()
-    cpu = ' '.join(cpu.split())
-    gpu = ' '.join(gpu.split())
-    ram = ' '.join(ram.split())
-    return f"{cpu}|{gpu}|{ram}"
+def create_results_markup(cursor, page):
+    markup = telebot.types.InlineKeyboardMarkup()
+    if cursor.page_count > 1:
+        buttons = []
+        if page > 0:
+            buttons.append(telebot.types.InlineKeyboardButton("◀️", callback_data=f"page:{cursor.result_id}:{page - 1}"))
+        buttons.append(telebot.types.InlineKeyboardButton(f"{page + 1}/{cursor.page_count}", callback_data="noop"))
+        if page < cursor.page_count - 1:
+            buttons.append(telebot.types.InlineKeyboardButton("▶️", callback_data=f"page:{cursor.result_id}:{page + 1}"))
+        markup.row(*buttons)
+    markup.row(telebot.types.InlineKeyboardButton("◀️ Назад в меню", callback_data="back_to_menu"))
+    return markup
+
+def render_results_page(cursor, page):
+    page = cursor.clamp_page(page)
+    return format_config_results(cursor.results, page, cursor.page_size), create_results_markup(cursor, page)
+
+def reply_with_results(message, results, version):
+    cursor = result_cache.put(message.chat.id, results, version)
+    response, markup = render_results_page(cursor, 0)
+    outbox.submit(message.chat.id, bot.reply_to, message, response, parse_mode='HTML', reply_markup=markup)
+
+def handle_results_page(call):
+    _, result_id, page = call.data.split(':')
+    cursor = result_cache.get(call.message.chat.id, int(result_id))
+    if cursor is None:
+        bot.answer_callback_query(call.id, "Результаты устарели, повторите поиск")
+        return
+    
+    text, markup = render_results_page(cursor, int(page))
+    edit_message(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=text,
+        parse_mode='HTML',
+        reply_markup=markup
+    )
+    bot.answer_callback_query(call.id)
+
+def search_by_full_config(search_index, query):
+    return search_index.search_full_config(query)
+
+def get_card_store():
+    global card_store
+    if card_store is None:
+        card_store = SQLiteCardStore(os.getenv("CARDS_DB_FILE", CARDS_DB_FILE), key_func=generate_card_key)
+        card_store.migrate_from_json(CARDS_JSON_FILE)
+    return card_store
+
+def load_cards_data_sqlite():
+    # One row per machine seen in the dump, plus legacy JSON rows for configurations
+    # no such machine has. The JSON mode keeps every configuration it ever appended,
+    # so the two modes return different card counts from the same files.
+    store = get_card_store()
+    store.ingest_dump(CARDS_HTML_FILE, history=price_history)
+    cards = store.load_cards()
+    print(f"Загружено {len(cards)} карточек из SQLite")
+    return cards
 
 def load_cards_data():
-    json_file = 'cards_data.json'
+    if CARDS_STORAGE == 'sqlite':
+        return load_cards_data_sqlite()
+    
+    json_file = CARDS_JSON_FILE
     
     try:
         with open(json_file, 'r', encoding='utf-8') as f:
@@ -291,29 +375,13 @@ def load_cards_data():
         existing_data = []
         print("JSON файл не найден, создаем новый")
     
-    html_content = load_html_from_file('cards.txt')
-    if not html_content:
-        print("HTML файл не найден или пуст")
-        return existing_data
-        
-    new_cards = parse_html_cards_simplified(html_content)
+    cards_by_id, report = ingest_cards(CARDS_HTML_FILE, history=price_history)
+    new_cards = list(cards_by_id.values())
     if not new_cards:
         print("Нет новых карточек для обработки")
         return existing_data
 
-    existing_configs = {generate_card_key(card) for card in existing_data}
-    
-    added_count = 0
-    duplicate_count = 0
-    
-    for card in new_cards:
-        card_key = generate_card_key(card)
-        if card_key not in existing_configs:
-            existing_data.append(card)
-            existing_configs.add(card_key)
-            added_count += 1
-        else:
-            duplicate_count += 1
+    added_count, duplicate_count = merge_by_config(existing_data, new_cards)
     
     if added_count > 0:
         with open(json_file, 'w', encoding='utf-8') as f:
@@ -323,32 +391,58 @@ def load_cards_data():
     print(f"Пропущено {duplicate_count} дубликатов")
     return existing_data
 
-async def analyze_with_ai(card_data_list):
-    try:
-        data_summary = {
-            'total_computers': len(card_data_list),
-            'price_range': [],
-            'components': {
-                'cpu': [],
-                'gpu': [],
-                'ram': []
-            }
-        }
-
-        for card in card_data_list:
-            if card['price'].replace('₽', '').replace(' ', '').isdigit():
-                data_summary['price_range'].append(int(card['price'].replace('₽', '').replace(' ', '')))
-            data_summary['components']['cpu'].append(card['cpu'])
-            data_summary['components']['gpu'].append(card['gpu'])
-            data_summary['components']['ram'].append(card['ram'])
+def dataset_source_state():
+    # the JSON and SQLite loaders return different datasets, and cards.db can
+    # change without any source file changing, so both go into the snapshot key
+    if CARDS_STORAGE == 'sqlite':
+        store = get_card_store()
+        return {'storage': 'sqlite', 'db': os.path.abspath(store.path), 'revision': store.revision()}
+    return {'storage': CARDS_STORAGE}
+
+dataset_store = DatasetStore(load_cards_data, [CARDS_HTML_FILE, CARDS_JSON_FILE],
+                             snapshot_path=SNAPSHOT_FILE or None, source_state=dataset_source_state)
+
+# reloads happen on the refresher thread; SCRAPE_INTERVAL (seconds) also re-downloads cards.txt
+DATASET_REFRESH_INTERVAL = float(os.getenv("DATASET_REFRESH_INTERVAL", REFRESH_INTERVAL))
+SCRAPE_INTERVAL = float(os.getenv("SCRAPE_INTERVAL", "0"))
+dataset_refresher = DatasetRefresher(
+    dataset_store,
+    DATASET_REFRESH_INTERVAL,
+    fetch=(lambda: scrape(os.getenv("FOGPLAY_URL", FOGPLAY_URL), CARDS_HTML_FILE)) if SCRAPE_INTERVAL > 0 else None,
+    fetch_interval=SCRAPE_INTERVAL,
+)
 
+async def request_ai(prompt, history=None):
+    chat = model.start_chat(history=history or [])
+    with metrics.timer('fogplay_ai_request_seconds'):
+        try:
+            response = await ai_runtime.run_blocking(chat.send_message, prompt)
+        except BaseException as e:
+            metrics.inc('fogplay_ai_errors_total', error=type(e).__name__)
+            raise
+    text = response.text if response and response.text else None
+    record_ai_tokens(prompt, history, response, text)
+    return text
+
+def record_ai_tokens(prompt, history, response, text):
+    if not metrics.enabled:
+        return
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        prompt_tokens = usage.prompt_token_count
+        response_tokens = usage.candidates_token_count
+    else:
+        prompt_tokens = estimate_tokens(prompt + history_text(history or []))
+        response_tokens = estimate_tokens(text or '')
+    metrics.inc('fogplay_ai_tokens_total', prompt_tokens, direction='prompt')
+    metrics.inc('fogplay_ai_tokens_total', response_tokens, direction='response')
+
+async def analyze_with_ai(ai_summary, dataset_fingerprint):
+    try:
         prompt = f"""
-        Проанализируй данные о {len(card_data_list)} компьютерах:
-        
-        Ценовой диапазон: от {min(data_summary['price_range']):,}₽ до {max(data_summary['price_range']):,}₽
+        Проанализируй данные о {ai_summary.total} компьютерах:
         
-        Топ CPU: {', '.join(list(set(data_summary['components']['cpu']))[:5])}
-        Топ GPU: {', '.join(list(set(data_summary['components']['gpu']))[:5])}
+        {ai_summary.text}
         
         Предоставь:
         1. Анализ соотношения цена/производительность
@@ -356,10 +450,9 @@ async def analyze_with_ai(card_data_list):
         3. Тренды и интересные наблюдения
         """
 
-        chat = model.start_chat(history=[])
-        response = chat.send_message(prompt)
+        response_text = await ai_cache.get_or_compute(dataset_fingerprint, prompt, lambda: request_ai(prompt))
         
-        return response.text if response and response.text else "AI анализ недоступен"
+        return response_text if response_text else "AI анализ недоступен"
 
     except Exception as e:
         logging.error(f"Error in AI analysis: {e}")
@@ -386,29 +479,41 @@ def split_long_message(text, max_length=4096):
     
     return parts
 
-async def ask_ai_custom_question(data_summary, question):
+async def ask_ai_custom_question(ai_summary, question, dataset_fingerprint, chat_id):
     try:
-        prompt = f"""
+        context_prompt = f"""
         На основе следующих данных о компьютерах ответь на вопрос:
         
         Данные:
-        - Всего компьютеров: {data_summary['total_computers']}
-        - Ценовой диапазон: от {min(data_summary['price_range']):,}₽ до {max(data_summary['price_range']):,}₽
-        - CPU: {', '.join(list(set(data_summary['components']['cpu']))[:5])}
-        - GPU: {', '.join(list(set(data_summary['components']['gpu']))[:5])}
+        {ai_summary.text}
         
         Вопрос: {question}
         """
 
-        chat = model.start_chat(history=[])
-        response = chat.send_message(prompt)
-        return response.text if response and response.text else "AI не смог ответить на вопрос"
+        # follow-ups in the same chat only send the question; the data is already in history
+        history, prompt = chat_sessions.prepare(chat_id, dataset_fingerprint, question, context_prompt)
+        cache_text = f"{history_text(history)}\n{prompt}"
+        response_text = await ai_cache.get_or_compute(
+            dataset_fingerprint, cache_text, lambda: request_ai(prompt, history)
+        )
+        if not response_text:
+            return "AI не смог ответить на вопрос"
+
+        chat_sessions.record(chat_id, dataset_fingerprint, prompt, response_text)
+        return response_text
 
     except Exception as e:
         logging.error(f"Error in custom AI question: {e}")
         return "Ошибка при обработке вопроса"
 
-def process_ai_question(message, data_summary):
+AI_BUSY_TEXT = "⏳ AI сейчас перегружен запросами, попробуйте чуть позже"
+
+def ai_error_text(error):
+    if isinstance(error, TimeoutError):
+        return "⏳ AI не ответил вовремя, попробуйте ещё раз"
+    return "❌ Ошибка при обращении к AI"
+
+def process_ai_question(message, ai_summary, dataset_fingerprint):
     try:
         question = message.text.strip()
         if len(question) < 5:
@@ -417,30 +522,40 @@ def process_ai_question(message, data_summary):
 
         processing_msg = bot.reply_to(message, "🤖 Обрабатываю ваш вопрос...")
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        response = loop.run_until_complete(ask_ai_custom_question(data_summary, question))
-        loop.close()
-
-        response_parts = split_long_message(response)
-        
-        bot.delete_message(message.chat.id, processing_msg.message_id)
-
-        markup = telebot.types.InlineKeyboardMarkup()
-        markup.row(telebot.types.InlineKeyboardButton("◀️ Назад в меню", callback_data="back_to_menu"))
-        
-        for i, part in enumerate(response_parts):
-            if i == len(response_parts) - 1:
-                bot.send_message(message.chat.id, part, parse_mode='HTML', reply_markup=markup)
-            else:
-                bot.send_message(message.chat.id, part, parse_mode='HTML')
+        ai_runtime.submit(
+            lambda: ask_ai_custom_question(ai_summary, question, dataset_fingerprint, message.chat.id),
+            on_result=lambda response: deliver_ai_answer(message, processing_msg, response),
+            on_error=lambda error: deliver_ai_answer(message, processing_msg, ai_error_text(error))
+        )
 
+    except AIBusyError:
+        edit_message(
+            chat_id=message.chat.id,
+            message_id=processing_msg.message_id,
+            text=AI_BUSY_TEXT
+        )
     except Exception as e:
         logging.error(f"Error processing AI question: {e}")
         bot.reply_to(message, "❌ Произошла ошибка при обработке вопроса")
 
+def deliver_ai_answer(message, processing_msg, response):
+    response_parts = split_long_message(response)
+    
+    markup = telebot.types.InlineKeyboardMarkup()
+    markup.row(telebot.types.InlineKeyboardButton("◀️ Назад в меню", callback_data="back_to_menu"))
+    
+    calls = [(bot.delete_message, (message.chat.id, processing_msg.message_id), {})]
+    for i, part in enumerate(response_parts):
+        if i == len(response_parts) - 1:
+            calls.append((bot.send_message, (message.chat.id, part), {'parse_mode': 'HTML', 'reply_markup': markup}))
+        else:
+            calls.append((bot.send_message, (message.chat.id, part), {'parse_mode': 'HTML'}))
+    outbox.submit_batch(message.chat.id, calls)
+
 @bot.message_handler(commands=['start', 'help'])
 def send_welcome(message):
+    # /start also cancels a prompt the chat never answered
+    conversation_states.clear(message.chat.id)
     markup = create_main_menu_markup()
     welcome_text = (
         "🤖 <b>Статистика и поиск компьютеров</b>\n\n"
@@ -450,14 +565,37 @@ def send_welcome(message):
         "- Поиск по полной конфигурации\n"
         "- Просмотр всех конфигураций"
     )
-    bot.send_message(message.chat.id, welcome_text, parse_mode='HTML', reply_markup=markup)
+    outbox.submit(message.chat.id, bot.send_message, message.chat.id, welcome_text, parse_mode='HTML', reply_markup=markup)
+
+# callback data the menus send; anything else a client makes up is counted as "other"
+CALLBACK_LABELS = frozenset(STATS_RENDERERS) | {
+    'noop', 'page', 'back_to_menu', 'search_cpu', 'search_gpu', 'search_ram', 'search_full',
+    'search_range', 'price_trend', 'all_configs', 'ai_analysis', 'ask_ai',
+}
+
+def callback_label(data):
+    # "page:<result_id>:<n>" -> "page", so the label set stays bounded
+    label = (data or '').split(':', 1)[0]
+    return label if label in CALLBACK_LABELS else 'other'
 
 @bot.callback_query_handler(func=lambda call: True)
 def callback_query(call):
+    with metrics.timer('fogplay_callback_seconds', data=callback_label(call.data)):
+        dispatch_callback(call)
+
+def dispatch_callback(call):
     try:
+        if call.data == "noop":
+            bot.answer_callback_query(call.id)
+            return
+
+        if call.data.startswith("page:"):
+            handle_results_page(call)
+            return
+
         if call.data == "back_to_menu":
             markup = create_main_menu_markup()
-            bot.edit_message_text(
+            edit_message(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
                 text="Вы вернулись в главное меню.",
@@ -467,33 +605,52 @@ def callback_query(call):
             bot.answer_callback_query(call.id)
             return
 
-        card_data_list = load_cards_data()
+        snapshot = dataset_store.snapshot()
+        card_data_list = snapshot.cards
         if not card_data_list:
             bot.answer_callback_query(call.id, "Ошибка: нет данных для анализа")
             return
 
         if call.data == "search_full":
-            msg = bot.send_message(
-                call.message.chat.id,
+            ask_for_reply(
+                call, "search_full", snapshot.version,
                 "Введите параметры конфигурации (процессор, видеокарта, память):\n"
-                "Например: i5-12400F RTX 4060 16GB",
-                reply_markup=telebot.types.ForceReply()
+                "Например: i5-12400F RTX 4060 16GB"
+            )
+            return
+
+        if call.data == "search_range":
+            ask_for_reply(
+                call, "search_range", snapshot.version,
+                "Введите условия через запятую (цена, ram, vram, ядра):\n"
+                "Например: цена <= 50, ram >= 32, vram >= 8\n"
+                "или: ≤ 50 ₽, ≥ 32 GB RAM, ≥ 8 GB VRAM, ядра >= 8"
+            )
+            return
+
+        if call.data == "price_trend":
+            ask_for_reply(
+                call, "price_trend", snapshot.version,
+                f"Введите модель видеокарты или процессора для динамики цен за {DEFAULT_TREND_DAYS} дней:\n"
+                "Например: RTX 4070 SUPER"
             )
-            bot.register_next_step_handler(msg, lambda m: process_full_search(m, card_data_list))
             return
 
         if call.data in ["search_cpu", "search_gpu", "search_ram"]:
             component_type = call.data.split('_')[1]
-            msg = bot.send_message(
-                call.message.chat.id,
-                f"Введите параметры поиска для {component_type.upper()}:",
-                reply_markup=telebot.types.ForceReply()
-            )
-            bot.register_next_step_handler(msg, lambda m: process_search(m, component_type, card_data_list))
+            ask_for_reply(call, call.data, snapshot.version, f"Введите параметры поиска для {component_type.upper()}:")
             return
         
         if call.data == "all_configs":
-            text = format_config_results(card_data_list)
+            cursor = result_cache.put(call.message.chat.id, card_data_list, snapshot.version)
+            text, markup = render_results_page(cursor, 0)
+            edit_message(
+                chat_id=call.message.chat.id,
+                message_id=call.message.message_id,
+                text=text,
+                parse_mode='HTML',
+                reply_markup=markup
+            )
         elif call.data == "ai_analysis":
             handle_ai_analysis(call)
             return
@@ -501,18 +658,14 @@ def callback_query(call):
             handle_ask_ai(call)
             return
         else:
-            if call.data == "overview":
-                text = get_quick_overview(card_data_list)
-            elif call.data == "prices":
-                text = get_price_stats(card_data_list)
-            elif call.data == "cpu":
-                text = get_cpu_stats(card_data_list)
-            elif call.data == "gpu":
-                text = get_gpu_stats(card_data_list)
-            elif call.data == "ram":
-                text = get_ram_stats(card_data_list)
-        
-            bot.edit_message_text(
+            render_stats = STATS_RENDERERS.get(call.data)
+            if render_stats is None:
+                bot.answer_callback_query(call.id, "Неизвестная команда")
+                return
+            text = stats_render_cache.get_or_render(
+                call.data, snapshot.version, lambda: render_stats(snapshot.aggregates)
+            )
+            edit_message(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
                 text=text,
@@ -523,47 +676,137 @@ def callback_query(call):
         
     except Exception as e:
         print(f"Error in callback_query: {e}")
+        metrics.inc('fogplay_callback_errors_total', data=callback_label(call.data))
         bot.answer_callback_query(call.id, "Произошла ошибка при обработке запроса")
 
-def process_search(message, component_type, card_data_list):
+def ask_for_reply(call, step, version, prompt):
+    # remembered before the prompt goes out, so even an instant reply finds it
+    conversation_states.set(call.message.chat.id, step, version)
+    outbox.submit(call.message.chat.id, bot.send_message, call.message.chat.id, prompt,
+                  reply_markup=telebot.types.ForceReply())
+
+def process_search(message, component_type, snapshot):
     query = message.text.strip()
     if len(query) < 2:
         bot.reply_to(message, "⚠️ Слишком короткий запрос. Минимум 2 символа.")
         return
     
-    results = search_by_component(card_data_list, component_type, query)
-    response = format_config_results(results)
-    
-    markup = telebot.types.InlineKeyboardMarkup()
-    markup.row(telebot.types.InlineKeyboardButton("◀️ Назад в меню", callback_data="back_to_menu"))
-    
-    bot.reply_to(message, response, parse_mode='HTML', reply_markup=markup)
+    results = search_by_component(snapshot.search_index, component_type, query)
+    reply_with_results(message, results, snapshot.version)
 
-def process_full_search(message, card_data_list):
+def process_full_search(message, snapshot):
     query = message.text.strip()
     if len(query) < 3:
         bot.reply_to(message, "⚠️ Слишком короткий запрос. Опишите конфигурацию подробнее.")
         return
     
-    results = search_by_full_config(card_data_list, query)
-    response = format_config_results(results)
+    results = search_by_full_config(snapshot.search_index, query)
+    reply_with_results(message, results, snapshot.version)
+
+def process_range_search(message, snapshot):
+    query = message.text.strip()
+    try:
+        filters = parse_range_query(query)
+    except RangeQueryError as e:
+        bot.reply_to(
+            message,
+            f"⚠️ {e}\n"
+            "Пример: цена <= 50, ram >= 32, vram >= 8, ядра >= 6\n"
+            "Число ядер известно только для процессоров, где оно указано в названии (AMD)."
+        )
+        return
+    
+    results = snapshot.range_index.query(filters)
+    reply_with_results(message, results, snapshot.version)
+
+def process_price_trend(message):
+    query = message.text.strip()
+    if len(query) < 2:
+        bot.reply_to(message, "⚠️ Слишком короткий запрос. Минимум 2 символа.")
+        return
     
     markup = telebot.types.InlineKeyboardMarkup()
     markup.row(telebot.types.InlineKeyboardButton("◀️ Назад в меню", callback_data="back_to_menu"))
-    
-    bot.reply_to(message, response, parse_mode='HTML', reply_markup=markup)
+    outbox.submit(message.chat.id, bot.reply_to, message, get_price_trend(query), parse_mode='HTML', reply_markup=markup)
+
+@bot.message_handler(commands=['metrics'])
+def send_metrics(message):
+    if message.from_user.id not in ADMIN_IDS:
+        send_welcome(message)
+        return
+    if not metrics.enabled:
+        bot.reply_to(message, "Метрики выключены (METRICS_ENABLED или METRICS_PORT не заданы)")
+        return
+    # split on line boundaries: split_long_message would cut at the dots in the numbers
+    parts = ['']
+    for line in metrics.render().splitlines(keepends=True):
+        if len(parts[-1]) + len(line) > 4000:
+            parts.append('')
+        parts[-1] += line
+    outbox.submit_batch(message.chat.id, [
+        (bot.send_message, (message.chat.id, f"<pre>{html.escape(part)}</pre>"), {'parse_mode': 'HTML'})
+        for part in parts if part
+    ])
+
+def format_inline_config(config):
+    return (f"📌 Конфигурация\n"
+            f"└ CPU: {config.cpu}\n"
+            f"└ GPU: {config.gpu}\n"
+            f"└ RAM: {config.ram}\n"
+            f"└ Цена: {config.price}")
+
+@bot.inline_handler(func=lambda query: True)
+def inline_search(inline_query):
+    # "@bot 4060" answers while the user types: prefix lookup over CPU/GPU names
+    query = inline_query.query.strip()
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    if len(query) < 2:
+        bot.answer_inline_query(inline_query.id, [], cache_time=INLINE_CACHE_TIME)
+        return
+
+    snapshot = dataset_store.snapshot()
+    # one extra id tells whether there is a next page
+    card_ids = snapshot.name_index.suggest(query, INLINE_RESULTS + 1, offset)
+    results = []
+    for card_id in card_ids[:INLINE_RESULTS]:
+        config = snapshot.cards[card_id]
+        results.append(telebot.types.InlineQueryResultArticle(
+            id=f"{snapshot.version}:{card_id}",
+            title=f"{config.price} · {config.gpu}",
+            description=f"{config.cpu}\n{config.ram}",
+            input_message_content=telebot.types.InputTextMessageContent(format_inline_config(config)),
+        ))
+    next_offset = str(offset + INLINE_RESULTS) if len(card_ids) > INLINE_RESULTS else ''
+    bot.answer_inline_query(inline_query.id, results, cache_time=INLINE_CACHE_TIME, next_offset=next_offset)
+
+# replies to ForceReply prompts; each gets the snapshot that is current when the reply arrives
+CONVERSATION_STEPS = {
+    'search_cpu': lambda message, snapshot: process_search(message, 'cpu', snapshot),
+    'search_gpu': lambda message, snapshot: process_search(message, 'gpu', snapshot),
+    'search_ram': lambda message, snapshot: process_search(message, 'ram', snapshot),
+    'search_full': process_full_search,
+    'search_range': process_range_search,
+    'price_trend': lambda message, snapshot: process_price_trend(message),
+    'ask_ai': lambda message, snapshot: process_ai_question(message, snapshot.ai_summary, snapshot.fingerprint),
+}
 
 @bot.message_handler(content_types=['text'])
 def handle_text(message):
-    send_welcome(message)
+    pending = conversation_states.pop(message.chat.id)
+    if pending is None:
+        send_welcome(message)
+        return
+    CONVERSATION_STEPS[pending.step](message, dataset_store.snapshot())
 
 def get_stats(message):
-    card_data_list = load_cards_data()
+    snapshot = dataset_store.snapshot()
+    card_data_list = snapshot.cards
     if card_data_list:
-        stats = generate_statistics(card_data_list)
+        stats = generate_statistics(snapshot.aggregates)
         formatted_text = format_stats_for_telegram(stats, card_data_list)
         if formatted_text:
-            bot.send_message(message.chat.id, formatted_text, parse_mode='HTML', disable_web_page_preview=True)
+            outbox.submit(message.chat.id, bot.send_message, message.chat.id, formatted_text,
+                          parse_mode='HTML', disable_web_page_preview=True)
         else:
             bot.reply_to(message, "⚠️ Не удалось сформировать статистику.")
     else:
@@ -596,6 +839,14 @@ def create_main_menu_markup():
         telebot.types.InlineKeyboardButton("🔍 Поиск по полной конфигурации", callback_data="search_full")
     )
     
+    markup.row(
+        telebot.types.InlineKeyboardButton("🎯 Поиск по параметрам", callback_data="search_range")
+    )
+    
+    markup.row(
+        telebot.types.InlineKeyboardButton("📈 Динамика цен", callback_data="price_trend")
+    )
+    
     markup.row(
         telebot.types.InlineKeyboardButton("🖥️ Все конфигурации", callback_data="all_configs")
     )
@@ -613,87 +864,118 @@ def create_main_menu_markup():
 @bot.callback_query_handler(func=lambda call: call.data == "ai_analysis")
 def handle_ai_analysis(call):
     try:
-        card_data_list = load_cards_data()
+        snapshot = dataset_store.snapshot()
+        card_data_list = snapshot.cards
         if not card_data_list:
             bot.answer_callback_query(call.id, "Нет данных для анализа")
             return
 
-        bot.edit_message_text(
+        edit_message(
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
             text="🤖 Выполняю AI анализ данных...",
             parse_mode='HTML'
         )
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        ai_response = loop.run_until_complete(analyze_with_ai(card_data_list))
-        loop.close()
-
-        response_parts = split_long_message(ai_response)
-        markup = telebot.types.InlineKeyboardMarkup()
-        markup.row(telebot.types.InlineKeyboardButton("◀️ Назад в меню", callback_data="back_to_menu"))
-
-        for i, part in enumerate(response_parts):
-            if i == 0:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text=f"🤖 <b>AI Анализ данных</b>\n\n{part}",
-                    parse_mode='HTML',
-                    reply_markup=markup if len(response_parts) == 1 else None
-                )
-            else:
-                bot.send_message(
-                    chat_id=call.message.chat.id,
-                    text=part,
-                    parse_mode='HTML',
-                    reply_markup=markup if i == len(response_parts)-1 else None
-                )
+        try:
+            ai_runtime.submit(
+                lambda: analyze_with_ai(snapshot.ai_summary, snapshot.fingerprint),
+                on_result=lambda ai_response: deliver_ai_analysis(call, ai_response),
+                on_error=lambda error: deliver_ai_analysis(call, ai_error_text(error))
+            )
+        except AIBusyError:
+            markup = telebot.types.InlineKeyboardMarkup()
+            markup.row(telebot.types.InlineKeyboardButton("◀️ Назад в меню", callback_data="back_to_menu"))
+            edit_message(
+                chat_id=call.message.chat.id,
+                message_id=call.message.message_id,
+                text=AI_BUSY_TEXT,
+                reply_markup=markup
+            )
+        bot.answer_callback_query(call.id)
 
     except Exception as e:
         logging.error(f"Error in AI analysis handler: {e}")
         bot.answer_callback_query(call.id, "Произошла ошибка при выполнении AI анализа")
 
+def deliver_ai_analysis(call, ai_response):
+    response_parts = split_long_message(ai_response)
+    markup = telebot.types.InlineKeyboardMarkup()
+    markup.row(telebot.types.InlineKeyboardButton("◀️ Назад в меню", callback_data="back_to_menu"))
+
+    calls = []
+    for i, part in enumerate(response_parts):
+        if i == 0:
+            calls.append((edit_message, (), {
+                'chat_id': call.message.chat.id,
+                'message_id': call.message.message_id,
+                'text': f"🤖 <b>AI Анализ данных</b>\n\n{part}",
+                'parse_mode': 'HTML',
+                'reply_markup': markup if len(response_parts) == 1 else None
+            }))
+        else:
+            calls.append((bot.send_message, (), {
+                'chat_id': call.message.chat.id,
+                'text': part,
+                'parse_mode': 'HTML',
+                'reply_markup': markup if i == len(response_parts)-1 else None
+            }))
+    outbox.submit_batch(call.message.chat.id, calls)
+
 @bot.callback_query_handler(func=lambda call: call.data == "ask_ai")
 def handle_ask_ai(call):
     try:
-        card_data_list = load_cards_data()
+        snapshot = dataset_store.snapshot()
+        card_data_list = snapshot.cards
         if not card_data_list:
             bot.answer_callback_query(call.id, "Нет данных для анализа")
             return
 
-        data_summary = {
-            'total_computers': len(card_data_list),
-            'price_range': [],
-            'components': {'cpu': [], 'gpu': [], 'ram': []}
-        }
-        
-        for card in card_data_list:
-            if card['price'].replace('₽', '').replace(' ', '').isdigit():
-                data_summary['price_range'].append(int(card['price'].replace('₽', '').replace(' ', '')))
-            data_summary['components']['cpu'].append(card['cpu'])
-            data_summary['components']['gpu'].append(card['gpu'])
-            data_summary['components']['ram'].append(card['ram'])
-
-        msg = bot.send_message(
-            call.message.chat.id,
+        ask_for_reply(
+            call, "ask_ai", snapshot.version,
             "🤖 Задайте ваш вопрос о компьютерах, например:\n"
             "- Какие конфигурации лучше всего подходят для игр?\n"
             "- В чём разница между разными видеокартами?\n"
-            "- Какое соотношение цена/качество оптимально?",
-            reply_markup=telebot.types.ForceReply()
+            "- Какое соотношение цена/качество оптимально?"
         )
         
-        bot.register_next_step_handler(msg, lambda m: process_ai_question(m, data_summary))
-        
     except Exception as e:
         logging.error(f"Error in ask_ai handler: {e}")
         bot.answer_callback_query(call.id, "Произошла ошибка")
 
+def warm_up():
+    # load the dataset and render the stats pages before the first update arrives
+    snapshot = dataset_store.snapshot()
+    for key, render_stats in STATS_RENDERERS.items():
+        stats_render_cache.get_or_render(key, snapshot.version, lambda: render_stats(snapshot.aggregates))
+    return snapshot
+
+def run_bot():
+    runtime = BotRuntime(bot, workers=HANDLER_WORKERS)
+    signal.signal(signal.SIGINT, lambda signum, frame: runtime.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: runtime.stop())
+    outbox.start()
+    dataset_refresher.start()
+    if WEBHOOK_URL:
+        runtime.start_webhook(WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, secret_token=WEBHOOK_SECRET)
+    else:
+        runtime.start_polling()
+    runtime.wait()
+
+    print("Остановка: дожидаемся обработчиков и отправки ответов...")
+    dataset_refresher.stop(SHUTDOWN_TIMEOUT)
+    runtime.shutdown(SHUTDOWN_TIMEOUT)
+    ai_runtime.shutdown(timeout=SHUTDOWN_TIMEOUT)
+    ai_cache.flush()
+    if not outbox.shutdown(timeout=SHUTDOWN_TIMEOUT):
+        logging.warning(f"{outbox.pending} ответов не отправлено")
+    print("Бот остановлен")
+
 if __name__ == '__main__':
     print("Бот запущен...")
-    initial_data = load_cards_data()
+    initial_data = warm_up().cards
     print(f"Загружено {len(initial_data)} карточек")
     print(f"Gemini AI интегрирован: {'успешно' if GEMINI_API_KEY else 'ошибка'}")
-    bot.polling(none_stop=True)
\ No newline at end of file
+    if METRICS_PORT:
+        start_http_server(int(METRICS_PORT))
+    run_bot()
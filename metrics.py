@@ -0,0 +1,187 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    'fogplay_callback_seconds': "Время обработки нажатия кнопки, по callback data",
+    'fogplay_callback_errors_total': "Нажатия кнопок, завершившиеся ошибкой",
+    'fogplay_stage_seconds': "Время этапов загрузки данных: инжест, разбор, индексы, снимок",
+    'fogplay_refresh_seconds': "Время фонового перестроения набора данных до подмены снимка",
+    'fogplay_refresh_total': "Фоновые перестроения набора данных: опубликованные и неудачные",
+    'fogplay_ingest_cards_total': "Карточки при инжесте: разобранные заново и пропущенные без изменений",
+    'fogplay_ai_request_seconds': "Время одного запроса к Gemini",
+    'fogplay_ai_errors_total': "Ошибки запросов к Gemini, по типу исключения",
+    'fogplay_ai_tokens_total': "Токены Gemini: prompt и response",
+    'fogplay_telegram_seconds': "Время вызова Telegram Bot API, по методу",
+    'fogplay_telegram_errors_total': "Ошибки вызовов Telegram Bot API, по методу",
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels_key, extra=()):
+    pairs = list(labels_key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NOOP_TIMER = _NoopTimer()
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'started')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.registry.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    # Disabled by default: every entry point checks one attribute and returns,
+    # so instrumented code pays next to nothing until enable() is called.
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.enabled = False
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = _labels_key(labels)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # per-bucket counts (last one is +Inf), then sum and count
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[position] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return NOOP_TIMER
+        return _Timer(self, name, labels)
+
+    def render(self):
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {key: list(state) for key, state in series.items()}
+                          for name, series in self._histograms.items()}
+
+        lines = []
+        for name in sorted(counters):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        for name in sorted(histograms):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, state in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), state):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(state[-2])}")
+                lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+def instrument_methods(target, method_names, histogram, error_counter, registry=metrics):
+    # wraps bound methods in place (e.g. TeleBot.send_message); call after enable()
+    if not registry.enabled:
+        return
+    for method_name in method_names:
+        original = getattr(target, method_name)
+
+        @functools.wraps(original)
+        def wrapper(*args, _original=original, _method=method_name, **kwargs):
+            started = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            except Exception:
+                registry.inc(error_counter, method=_method)
+                raise
+            finally:
+                registry.observe(histogram, time.perf_counter() - started, method=_method)
+
+        setattr(target, method_name, wrapper)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = metrics
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='127.0.0.1', registry=metrics):
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    print(f"Метрики Prometheus: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,93 @@
+import heapq
+import re
+from bisect import bisect_left
+from itertools import chain, islice
+
+from records import VRAM_RE
+from search_index import query_runs
+
+NAME_FIELDS = ('cpu', 'gpu')
+SUGGEST_LIMIT = 20
+TRADEMARK_RE = re.compile(r'\((?:R|TM|C)\)', re.IGNORECASE)
+
+
+def normalize_name(text):
+    # "Intel(R) Core(TM) i5" -> "intel core i5"
+    return ' '.join(query_runs(TRADEMARK_RE.sub(' ', text)))
+
+
+def gpu_short_name(gpu):
+    # what the card markup carries in data-gpu: the GPU name without its memory size
+    return VRAM_RE.sub('', gpu).strip()
+
+
+def name_keys(normalized):
+    # every word-suffix of the name, spaced and glued, so "4060", "rtx 40"
+    # and "rtx4060" are all prefixes of some key of "nvidia geforce rtx 4060"
+    words = normalized.split()
+    keys = set()
+    for start in range(len(words)):
+        keys.add(' '.join(words[start:]))
+        keys.add(''.join(words[start:]))
+    return keys
+
+
+def price_order(card):
+    return (card.price_value is None, card.price_value or 0)
+
+
+class NameIndex:
+    # Autocomplete over the few distinct CPU/GPU names rather than the cards:
+    # one sorted key list answers a prefix with a bisect, and each name keeps
+    # its card ids cheapest first, so the top-k is a lazy merge of those lists.
+    def __init__(self, cards):
+        self.cards = cards
+        card_ids = {}
+        for card_id, card in enumerate(cards):
+            for field in NAME_FIELDS:
+                name = getattr(card, field)
+                if name:
+                    card_ids.setdefault(name, []).append(card_id)
+
+        self.names = list(card_ids)
+        self.card_ids = []
+        entries = set()
+        for name_id, name in enumerate(self.names):
+            ids = card_ids[name]
+            ids.sort(key=lambda card_id: price_order(cards[card_id]))
+            self.card_ids.append(ids)
+            variants = {normalize_name(name), normalize_name(gpu_short_name(name))}
+            for variant in variants:
+                for key in name_keys(variant):
+                    entries.add((key, name_id))
+
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.key_names = [name_id for _, name_id in entries]
+
+    def matching_names(self, query):
+        # (exact, prefix) name ids: "rtx 4060" is exact for the plain 4060 and
+        # only a prefix for the 4060 Ti
+        normalized = normalize_name(query)
+        if not normalized:
+            return [], []
+        exact, prefix = {}, {}
+        for probe in dict.fromkeys((normalized, normalized.replace(' ', ''))):
+            position = bisect_left(self.keys, probe)
+            while position < len(self.keys) and self.keys[position].startswith(probe):
+                target = exact if self.keys[position] == probe else prefix
+                target[self.key_names[position]] = True
+                position += 1
+        return list(exact), [name_id for name_id in prefix if name_id not in exact]
+
+    def _ranked(self, name_ids):
+        return heapq.merge(*(self.card_ids[name_id] for name_id in name_ids),
+                           key=lambda card_id: price_order(self.cards[card_id]))
+
+    def suggest(self, query, limit=SUGGEST_LIMIT, offset=0):
+        # card ids, exact name matches first, each tier cheapest first
+        exact, prefix = self.matching_names(query)
+        seen = set()
+        unique = (card_id for card_id in chain(self._ranked(exact), self._ranked(prefix))
+                  if not (card_id in seen or seen.add(card_id)))
+        return list(islice(unique, offset, offset + limit))
@@ -0,0 +1,206 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime
+
+from ingest import read_json, write_json_atomic
+from records import parse_price
+from search_index import index_tokens, phrase_matches, query_runs
+
+PRICE_HISTORY_FILE = 'price_history.json'
+DEFAULT_TREND_DAYS = 30
+UNKNOWN_PRICE = 0
+
+TrendDay = namedtuple('TrendDay', ['date', 'available', 'min_price', 'median_price'])
+PriceTrend = namedtuple('PriceTrend', ['matched', 'days', 'price_changes', 'appeared', 'disappeared'])
+
+
+def _encode_deltas(values):
+    previous = 0
+    deltas = []
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+
+def _decode_deltas(deltas):
+    value = 0
+    values = []
+    for delta in deltas:
+        value += delta
+        values.append(value)
+    return values
+
+
+def decode_events(events):
+    # flat [dt, dprice, dt, dprice, ...] -> [(timestamp, price or None)];
+    # dprice None marks the machine disappearing, the next delta continues
+    # from the last known price
+    decoded = []
+    timestamp = 0
+    price = UNKNOWN_PRICE
+    for i in range(0, len(events), 2):
+        timestamp += events[i]
+        if events[i + 1] is None:
+            decoded.append((timestamp, None))
+        else:
+            price += events[i + 1]
+            decoded.append((timestamp, price))
+    return decoded
+
+
+def state_at(decoded, timestamp):
+    position = bisect_right(decoded, timestamp, key=lambda event: event[0])
+    if position == 0:
+        return None
+    return decoded[position - 1][1]
+
+
+class ComputerHistory:
+    __slots__ = ('cpu', 'gpu', 'events', 'last_time', 'last_price', 'present')
+
+    def __init__(self, cpu, gpu, events):
+        self.cpu = cpu
+        self.gpu = gpu
+        self.events = events
+        self.last_time = 0
+        self.last_price = UNKNOWN_PRICE
+        self.present = False
+        for timestamp, price in decode_events(events):
+            self.last_time = timestamp
+            self.present = price is not None
+            if price is not None:
+                self.last_price = price
+
+    def append(self, timestamp, price):
+        self.events.append(timestamp - self.last_time)
+        if price is None:
+            self.events.append(None)
+            self.present = False
+        else:
+            self.events.append(price - self.last_price)
+            self.last_price = price
+            self.present = True
+        self.last_time = timestamp
+
+
+class PriceHistory:
+    # One event per appearance, price change or disappearance of a machine, so
+    # an ingest that changes nothing only appends its timestamp to `snapshots`.
+    def __init__(self, path=PRICE_HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.snapshots = []
+        self.computers = {}
+        self._load()
+
+    def _load(self):
+        stored = read_json(self.path, {})
+        self.snapshots = _decode_deltas(stored.get('snapshots', []))
+        self.computers = {
+            computer_id: ComputerHistory(entry.get('cpu', ''), entry.get('gpu', ''), entry.get('events', []))
+            for computer_id, entry in stored.get('computers', {}).items()
+        }
+
+    def _save(self):
+        data = {
+            'snapshots': _encode_deltas(self.snapshots),
+            'computers': {
+                computer_id: {'cpu': history.cpu, 'gpu': history.gpu, 'events': history.events}
+                for computer_id, history in self.computers.items()
+            },
+        }
+        write_json_atomic(self.path, data)
+
+    def record(self, cards_by_id, observed_at=None):
+        observed_at = int(observed_at if observed_at is not None else time.time())
+        with self._lock:
+            if self.snapshots and observed_at <= self.snapshots[-1]:
+                observed_at = self.snapshots[-1] + 1
+            changes = 0
+            for computer_id, card in cards_by_id.items():
+                price = parse_price(card.get('price', ''))
+                price = UNKNOWN_PRICE if price is None else price
+                history = self.computers.get(computer_id)
+                if history is None:
+                    history = self.computers[computer_id] = ComputerHistory(card.get('cpu', ''), card.get('gpu', ''), [])
+                else:
+                    history.cpu = card.get('cpu', '')
+                    history.gpu = card.get('gpu', '')
+                if not history.present or history.last_price != price:
+                    history.append(observed_at, price)
+                    changes += 1
+
+            for computer_id, history in self.computers.items():
+                if history.present and computer_id not in cards_by_id:
+                    history.append(observed_at, None)
+                    changes += 1
+
+            self.snapshots.append(observed_at)
+            self._save()
+        return changes
+
+    def _matching(self, query):
+        runs = query_runs(query)
+        if not runs:
+            return []
+        # a few dozen distinct CPU/GPU names are shared by every machine
+        token_cache = {}
+        matched = []
+        for history in self.computers.values():
+            text = f"{history.cpu} {history.gpu}"
+            tokens = token_cache.get(text)
+            if tokens is None:
+                tokens = token_cache[text] = index_tokens(text)
+            if not all(any(token.startswith(run) for token in tokens) for run in runs):
+                continue
+            # the token check ignores word order; as in search, the words must
+            # also follow each other in one name ("rtx 4070 super" is not the Ti SUPER)
+            if len(runs) > 1 and not (phrase_matches(runs, history.cpu) or phrase_matches(runs, history.gpu)):
+                continue
+            matched.append(history)
+        return matched
+
+    def price_trend(self, query, days=DEFAULT_TREND_DAYS, now=None):
+        now = now if now is not None else time.time()
+        since = now - days * 24 * 60 * 60
+        with self._lock:
+            matched = self._matching(query)
+            timelines = [decode_events(history.events) for history in matched]
+            snapshots = [timestamp for timestamp in self.snapshots if since <= timestamp <= now]
+
+        # the last snapshot of each day stands for that day
+        day_ends = {}
+        for timestamp in snapshots:
+            day_ends[datetime.fromtimestamp(timestamp).date()] = timestamp
+
+        trend_days = []
+        for date, timestamp in sorted(day_ends.items()):
+            prices = sorted(
+                price for price in (state_at(timeline, timestamp) for timeline in timelines)
+                if price is not None
+            )
+            known = [price for price in prices if price != UNKNOWN_PRICE]
+            trend_days.append(TrendDay(
+                date, len(prices),
+                known[0] if known else None,
+                known[len(known) // 2] if known else None,
+            ))
+
+        price_changes = appeared = disappeared = 0
+        first_snapshot = snapshots[0] if snapshots else now
+        for timeline in timelines:
+            previous = state_at(timeline, first_snapshot)
+            for timestamp, price in timeline:
+                if timestamp <= first_snapshot or timestamp > now:
+                    continue
+                if price is None:
+                    disappeared += 1
+                elif previous is None:
+                    appeared += 1
+                elif price != previous:
+                    price_changes += 1
+                previous = price
+        return PriceTrend(len(matched), trend_days, price_changes, appeared, disappeared)
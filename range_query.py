@@ -0,0 +1,170 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+RANGE_COLUMNS = ('price_value', 'ram_gb', 'vram_mb', 'cpu_cores')
+
+# drivers report a bit less than the nominal size ("8 GB" RTX 4060 -> 7957 Mb)
+VRAM_NOMINAL_TOLERANCE = 0.95
+
+RangeFilter = namedtuple('RangeFilter', ['column', 'low', 'high'])
+
+FIELD_ALIASES = {
+    'price_value': ('цена', 'price', 'стоимость', '₽', 'руб', 'р'),
+    'ram_gb': ('ram', 'озу', 'память', 'оперативка'),
+    'vram_mb': ('vram', 'видеопамять', 'gpu', 'видеокарта', 'гпу'),
+    'cpu_cores': ('cores', 'ядра', 'ядер', 'ядро', 'cpu', 'процессор', 'цпу'),
+}
+ALIAS_TO_COLUMN = {alias: column for column, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+OPERATORS = {'<=': '<=', '≤': '<=', '>=': '>=', '≥': '>=', '<': '<', '>': '>', '=': '='}
+OP_PATTERN = r'(?P<op><=|>=|≤|≥|<|>|=)'
+NUMBER_PATTERN = r'(?P<value>\d+)\s*(?P<unit>gb|гб|mb|мб|₽|руб\.?|р\.?)?(?:\s*/\s*\S+)?'
+
+FIELD_FIRST_RE = re.compile(r'^(?P<field>[a-zа-яё₽]+)\s*' + OP_PATTERN + r'\s*' + NUMBER_PATTERN + r'$', re.IGNORECASE)
+OP_FIRST_RE = re.compile(r'^' + OP_PATTERN + r'\s*' + NUMBER_PATTERN + r'\s*(?P<field>[a-zа-яё]+)?$', re.IGNORECASE)
+
+
+class RangeQueryError(ValueError):
+    pass
+
+
+def _column_for(field, unit):
+    if field:
+        column = ALIAS_TO_COLUMN.get(field.lower())
+        if column is None:
+            raise RangeQueryError(f"Неизвестный параметр: {field}")
+        return column
+    if unit and unit.lower().rstrip('.') in ('₽', 'руб', 'р'):
+        return 'price_value'
+    raise RangeQueryError("Не указан параметр (цена, ram, vram, ядра)")
+
+
+def _nominal_vram_bounds(op, value):
+    # A card sold as N GB reports somewhere in [N * 1024 * 0.95, N * 1024] Mb, so
+    # strictness is decided on the nominal size before the tolerance is applied:
+    # "> 8" starts past every 8 GB card, "< 8" stops short of all of them.
+    nominal = value * 1024
+    floor = int(nominal * VRAM_NOMINAL_TOLERANCE)
+    if op == '<=':
+        return (None, nominal)
+    if op == '<':
+        return (None, floor - 1)
+    if op == '>=':
+        return (floor, None)
+    if op == '>':
+        return (nominal + 1, None)
+    return (floor, nominal)
+
+
+def _bounds(column, op, value, unit):
+    unit = (unit or '').lower()
+    if column == 'vram_mb' and unit not in ('mb', 'мб'):
+        return _nominal_vram_bounds(op, value)
+    if column == 'ram_gb' and unit in ('mb', 'мб'):
+        value //= 1024
+    if op == '<=':
+        return (None, value)
+    if op == '<':
+        return (None, value - 1)
+    if op == '>=':
+        return (value, None)
+    if op == '>':
+        return (value + 1, None)
+    return (value, value)
+
+
+def parse_range_query(text):
+    filters = {}
+    for piece in re.split(r'[,;\n]+', text):
+        piece = ' '.join(piece.split())
+        if not piece:
+            continue
+        match = FIELD_FIRST_RE.match(piece) or OP_FIRST_RE.match(piece)
+        if not match:
+            raise RangeQueryError(f"Не удалось разобрать условие: {piece}")
+
+        op = OPERATORS[match.group('op')]
+        unit = match.group('unit')
+        column = _column_for(match.group('field'), unit)
+        low, high = _bounds(column, op, int(match.group('value')), unit)
+
+        # several conditions on one column narrow the same range
+        previous_low, previous_high = filters.get(column, (None, None))
+        if previous_low is not None and (low is None or previous_low > low):
+            low = previous_low
+        if previous_high is not None and (high is None or previous_high < high):
+            high = previous_high
+        filters[column] = (low, high)
+
+    if not filters:
+        raise RangeQueryError("Пустой запрос")
+    return [RangeFilter(column, low, high) for column, (low, high) in filters.items()]
+
+
+class RangeIndex:
+    def __init__(self, cards):
+        self.cards = cards
+        self.values = {}
+        self.ids = {}
+        for column in RANGE_COLUMNS:
+            pairs = sorted(
+                (getattr(card, column), card_id)
+                for card_id, card in enumerate(cards)
+                if getattr(card, column) is not None
+            )
+            self.values[column] = [value for value, _ in pairs]
+            self.ids[column] = [card_id for _, card_id in pairs]
+
+    @classmethod
+    def from_parts(cls, cards, values, ids):
+        range_index = cls.__new__(cls)
+        range_index.cards = cards
+        range_index.values = values
+        range_index.ids = ids
+        return range_index
+
+    def _slice(self, range_filter):
+        values = self.values[range_filter.column]
+        start = 0 if range_filter.low is None else bisect_left(values, range_filter.low)
+        end = len(values) if range_filter.high is None else bisect_right(values, range_filter.high)
+        return start, max(start, end)
+
+    def select_ids(self, filters):
+        if not filters:
+            return []
+        slices = sorted(((self._slice(f), f) for f in filters), key=lambda item: item[0][1] - item[0][0])
+
+        (start, end), narrowest = slices[0]
+        candidates = set(self.ids[narrowest.column][start:end])
+        for (start, end), range_filter in slices[1:]:
+            if not candidates:
+                break
+            if end - start > 4 * len(candidates):
+                # wide range: checking the few remaining cards beats materialising the slice
+                low, high, column = range_filter.low, range_filter.high, range_filter.column
+                candidates = {
+                    card_id for card_id in candidates
+                    if _within(getattr(self.cards[card_id], column), low, high)
+                }
+            else:
+                candidates.intersection_update(self.ids[range_filter.column][start:end])
+        return sorted(candidates, key=lambda card_id: _price_order(self.cards[card_id], card_id))
+
+    def query(self, filters):
+        return [self.cards[card_id] for card_id in self.select_ids(filters)]
+
+
+def _price_order(card, card_id):
+    price = card.price_value
+    return (price is None, price or 0, card_id)
+
+
+def _within(value, low, high):
+    if value is None:
+        return False
+    if low is not None and value < low:
+        return False
+    if high is not None and value > high:
+        return False
+    return True
@@ -0,0 +1,79 @@
+import re
+import sys
+from collections import namedtuple
+
+VRAM_RE = re.compile(r'(\d+)\s*(Mb|Gb)\s*$', re.IGNORECASE)
+RAM_RE = re.compile(r'(\d+)\s*(Gb|Mb|Tb)?', re.IGNORECASE)
+CORES_RE = re.compile(r'(\d+|[a-z]+)-Core', re.IGNORECASE)
+CORE_WORDS = {'dual': 2, 'quad': 4, 'six': 6, 'eight': 8, 'twelve': 12, 'sixteen': 16}
+
+RECORD_FIELDS = ['cpu', 'gpu', 'ram', 'price', 'price_value', 'ram_gb', 'vram_mb', 'cpu_cores']
+
+
+def parse_price(price):
+    price_str = price.replace('₽', '').replace(' ', '')
+    return int(price_str) if price_str.isdigit() else None
+
+
+def parse_ram_gb(ram):
+    match = RAM_RE.search(ram)
+    if not match:
+        return None
+    value = int(match.group(1))
+    unit = (match.group(2) or 'Gb').lower()
+    if unit == 'mb':
+        return value // 1024
+    if unit == 'tb':
+        return value * 1024
+    return value
+
+
+def parse_vram_mb(gpu):
+    match = VRAM_RE.search(gpu)
+    if not match:
+        return None
+    value = int(match.group(1))
+    return value * 1024 if match.group(2).lower() == 'gb' else value
+
+
+def parse_cpu_cores(cpu):
+    # only AMD names carry the core count ("6-Core", "Eight-Core"); Intel ones stay None
+    match = CORES_RE.search(cpu)
+    if not match:
+        return None
+    cores = match.group(1)
+    return int(cores) if cores.isdigit() else CORE_WORDS.get(cores.lower())
+
+
+def _intern(value):
+    return sys.intern(value) if value else ''
+
+
+class CardRecord(namedtuple('CardRecord', RECORD_FIELDS)):
+    # Immutable, tuple-backed card: raw display strings are interned (a few dozen
+    # distinct CPU/GPU/RAM names are shared by every card) and the numeric fields
+    # are parsed once at ingest instead of on every request.
+    __slots__ = ()
+
+    @classmethod
+    def from_card(cls, card):
+        if isinstance(card, cls):
+            return card
+        cpu = _intern(card.get('cpu', '').strip())
+        gpu = _intern(card.get('gpu', '').strip())
+        ram = _intern(card.get('ram', '').strip())
+        price = _intern(card.get('price', ''))
+        return cls(
+            cpu, gpu, ram, price,
+            parse_price(price),
+            parse_ram_gb(ram),
+            parse_vram_mb(gpu),
+            parse_cpu_cores(cpu),
+        )
+
+    def to_dict(self):
+        return {'cpu': self.cpu, 'gpu': self.gpu, 'ram': self.ram, 'price': self.price}
+
+
+def build_records(cards):
+    return tuple(CardRecord.from_card(card) for card in cards)
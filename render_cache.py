@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+MAX_TRACKED_MESSAGES = 10000
+
+
+class RenderCache:
+    # rendered text per (key, dataset version); a new version drops every older render
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = {}
+
+    def get_or_render(self, key, version, render):
+        with self._lock:
+            if version == self._version and key in self._entries:
+                return self._entries[key]
+        text = render()
+        with self._lock:
+            if version != self._version:
+                if self._version is not None and version < self._version:
+                    return text
+                self._version = version
+                self._entries = {}
+            self._entries[key] = text
+        return text
+
+
+def markup_key(reply_markup):
+    if reply_markup is None:
+        return None
+    to_json = getattr(reply_markup, 'to_json', None)
+    return to_json() if to_json is not None else repr(reply_markup)
+
+
+def content_digest(text, parse_mode, reply_markup):
+    payload = f"{parse_mode}\0{markup_key(reply_markup)}\0{text}"
+    return hashlib.sha1(payload.encode('utf-8')).digest()
+
+
+class ShownMessages:
+    # What each bot message currently shows, as a digest of text + parse mode +
+    # keyboard, so an identical edit can be skipped before it reaches Telegram.
+    def __init__(self, max_messages=MAX_TRACKED_MESSAGES):
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._digests = OrderedDict()
+
+    def is_shown(self, chat_id, message_id, digest):
+        with self._lock:
+            return self._digests.get((chat_id, message_id)) == digest
+
+    def remember(self, chat_id, message_id, digest):
+        with self._lock:
+            self._digests[(chat_id, message_id)] = digest
+            self._digests.move_to_end((chat_id, message_id))
+            while len(self._digests) > self.max_messages:
+                self._digests.popitem(last=False)
+
+    def forget(self, chat_id, message_id):
+        with self._lock:
+            self._digests.pop((chat_id, message_id), None)
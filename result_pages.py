@@ -0,0 +1,95 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+PAGE_SIZE = 8
+MAX_CHATS = 1000
+MAX_RESULTS_PER_CHAT = 5
+RESULT_TTL = 30 * 60
+SWEEP_EVERY = 100
+
+
+class ResultCursor:
+    # Holds a reference to the already computed result sequence (for "all configs"
+    # that is the snapshot's own tuple), never a rendered copy; pages are sliced and
+    # formatted only when asked for.
+    __slots__ = ('result_id', 'results', 'version', 'page_size')
+
+    def __init__(self, result_id, results, version, page_size=PAGE_SIZE):
+        self.result_id = result_id
+        self.results = results
+        self.version = version
+        self.page_size = page_size
+
+    @property
+    def total(self):
+        return len(self.results)
+
+    @property
+    def page_count(self):
+        return max(1, -(-len(self.results) // self.page_size))
+
+    def clamp_page(self, page):
+        return min(max(page, 0), self.page_count - 1)
+
+
+class ResultCache:
+    def __init__(self, max_chats=MAX_CHATS, max_per_chat=MAX_RESULTS_PER_CHAT, ttl=RESULT_TTL, clock=time.monotonic):
+        self.max_chats = max_chats
+        self.max_per_chat = max_per_chat
+        self.ttl = ttl
+        self._clock = clock
+        self._chats = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def put(self, chat_id, results, version, page_size=PAGE_SIZE):
+        with self._lock:
+            self._puts += 1
+            if self._puts % SWEEP_EVERY == 0:
+                self._evict_expired()
+            cursor = ResultCursor(next(self._ids), results, version, page_size)
+            entries = self._chats.pop(chat_id, None) or OrderedDict()
+            entries[cursor.result_id] = (cursor, self._clock() + self.ttl)
+            while len(entries) > self.max_per_chat:
+                entries.popitem(last=False)
+            self._chats[chat_id] = entries
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+            return cursor
+
+    def get(self, chat_id, result_id):
+        with self._lock:
+            entries = self._chats.get(chat_id)
+            if not entries or result_id not in entries:
+                return None
+            cursor, expires_at = entries[result_id]
+            now = self._clock()
+            if expires_at < now:
+                del entries[result_id]
+                if not entries:
+                    del self._chats[chat_id]
+                return None
+            entries[result_id] = (cursor, now + self.ttl)
+            entries.move_to_end(result_id)
+            self._chats.move_to_end(chat_id)
+            return cursor
+
+    def evict_expired(self):
+        with self._lock:
+            self._evict_expired()
+
+    def _evict_expired(self):
+        now = self._clock()
+        for chat_id in list(self._chats):
+            entries = self._chats[chat_id]
+            for result_id in [rid for rid, (_, expires_at) in entries.items() if expires_at < now]:
+                del entries[result_id]
+            if not entries:
+                del self._chats[chat_id]
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._chats.values())
@@ -0,0 +1,280 @@
+import argparse
+import hashlib
+import html
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from card_parser import iter_card_blocks, iter_file_chunks
+from dataset import file_content_hash
+from ingest import read_json, write_json_atomic
+
+FOGPLAY_URL = 'https://fogplay.mts.ru/'
+SCRAPE_CACHE_DIR = 'scrape_cache'
+SCRAPE_WORKERS = 4
+MAX_PAGES = 200
+REQUEST_TIMEOUT = (5, 30)
+STREAM_CHUNK = 64 * 1024
+USER_AGENT = 'fogplay-bot (+https://github.com/Bolidik/fogplay.mts)'
+
+# the grid's data-infinite-scroll config points at "#servers .pagination__next"
+NEXT_LINK_RE = re.compile(r'<a\b[^>]*\bclass="[^"]*\bpagination__next\b[^"]*"[^>]*>', re.IGNORECASE)
+HREF_RE = re.compile(r'\bhref="([^"]*)"', re.IGNORECASE)
+PAGE_PARAM_RE = re.compile(r'([?&](?:page|PAGEN_\d+)=)(\d+)', re.IGNORECASE)
+# kept from the previous chunk so a link split across two chunks is still found
+NEXT_LINK_OVERLAP = 1024
+# a scrape finding fewer than this share of the machines in the current dump is
+# taken for a broken page (maintenance, changed markup), not for machines leaving
+MIN_KEEP_RATIO = 0.5
+
+PageResult = namedtuple('PageResult', ['url', 'number', 'status', 'ids', 'next_url', 'chars', 'seconds'])
+ScrapeReport = namedtuple('ScrapeReport', ['pages', 'cards', 'duplicates', 'not_modified', 'changed', 'seconds'])
+
+
+class ScrapeError(Exception):
+    pass
+
+
+def make_session(workers=SCRAPE_WORKERS):
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']))
+    # one keep-alive connection per worker, reused across pages and runs
+    adapter = HTTPAdapter(pool_maxsize=workers, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+class NextLinkScanner:
+    # passes chunks through unchanged, remembering the first pagination__next href
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.next_url = None
+        self.chars = 0
+        self._tail = ''
+
+    def scan(self, chunks):
+        for chunk in chunks:
+            self.chars += len(chunk)
+            if self.next_url is None:
+                window = self._tail + chunk
+                match = NEXT_LINK_RE.search(window)
+                href = HREF_RE.search(match.group(0)) if match else None
+                if href and href.group(1):
+                    self.next_url = urljoin(self.base_url, html.unescape(href.group(1)))
+                self._tail = window[-NEXT_LINK_OVERLAP:]
+            yield chunk
+
+
+class PageCache:
+    # per-URL validators plus the page's card markup, so a 304 can be reused as is
+    def __init__(self, cache_dir=SCRAPE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = read_json(self.index_path, {})
+
+    def page_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.html')
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None or not os.path.exists(self.page_path(url)):
+            return None
+        return entry
+
+    def put(self, url, entry):
+        with self._lock:
+            self._entries[url] = entry
+
+    def save(self):
+        with self._lock:
+            write_json_atomic(self.index_path, self._entries)
+
+
+def fetch_page(session, cache, url, number):
+    # streams the body through the card splitter into the page's cache file
+    started = time.perf_counter()
+    entry = cache.get(url)
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    with session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        if response.status_code == 304 and entry is not None:
+            return PageResult(url, number, 304, entry['ids'], entry['next_url'], 0, time.perf_counter() - started)
+        if response.status_code == 404 and number > 1:
+            # asked for a page past the last one
+            return PageResult(url, number, 404, [], None, 0, time.perf_counter() - started)
+        response.raise_for_status()
+        if 'charset' not in response.headers.get('Content-Type', '').lower():
+            response.encoding = 'utf-8'
+
+        scanner = NextLinkScanner(response.url or url)
+        ids = []
+        page_path = cache.page_path(url)
+        tmp_path = f"{page_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for computer_id, block in iter_card_blocks(scanner.scan(response.iter_content(STREAM_CHUNK, decode_unicode=True))):
+                f.write(block)
+                ids.append(computer_id)
+        os.replace(tmp_path, page_path)
+
+    cache.put(url, {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'ids': ids,
+        'next_url': scanner.next_url,
+    })
+    return PageResult(url, number, response.status_code, ids, scanner.next_url, scanner.chars,
+                      time.perf_counter() - started)
+
+
+def page_numbering(next_url):
+    # "...?page=2" -> a function building the URL of page n, and 2
+    match = PAGE_PARAM_RE.search(next_url or '')
+    if match is None:
+        return None, None
+    prefix, suffix = next_url[:match.start(2)], next_url[match.end(2):]
+    return (lambda number: f"{prefix}{number}{suffix}"), int(match.group(2))
+
+
+def fetch_numbered(session, cache, page_url, first_number, workers, max_pages):
+    # Keeps up to `workers` pages in flight ahead of the one being read. Pages are
+    # consumed in order and the run stops at the first empty page or one without
+    # a next link, so at most workers - 1 requests past the end are wasted.
+    pages = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scrape') as executor:
+        futures = {}
+        submitted = number = first_number
+        while number <= max_pages:
+            while submitted <= max_pages and len(futures) < workers:
+                futures[submitted] = executor.submit(fetch_page, session, cache, page_url(submitted), submitted)
+                submitted += 1
+            page = futures.pop(number).result()
+            if not page.ids:
+                break
+            pages.append(page)
+            if page.next_url != page_url(number + 1):
+                # last page, or the site stopped numbering its pages the same way
+                break
+            number += 1
+        for future in futures.values():
+            future.cancel()
+    return pages
+
+
+def follow_pages(session, cache, url, number, max_pages, seen):
+    pages = []
+    while url and number <= max_pages and url not in seen:
+        seen.add(url)
+        page = fetch_page(session, cache, url, number)
+        if not page.ids:
+            break
+        pages.append(page)
+        url = page.next_url
+        number += 1
+    return pages
+
+
+def count_dump_machines(path):
+    try:
+        return len({computer_id for computer_id, _ in iter_card_blocks(iter_file_chunks(path)) if computer_id})
+    except FileNotFoundError:
+        return 0
+
+
+def write_dump(output_path, page_paths):
+    # only replaces the dump when the content changed, so its mtime and hash stay put otherwise
+    tmp_path = f"{output_path}.tmp"
+    digest = hashlib.sha256()
+    with open(tmp_path, 'wb') as out:
+        for page_path in page_paths:
+            with open(page_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+                    out.write(chunk)
+    if digest.hexdigest() == file_content_hash(output_path):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, output_path)
+    return True
+
+
+def scrape(start_url=FOGPLAY_URL, output_path='cards.txt', cache_dir=SCRAPE_CACHE_DIR,
+           workers=SCRAPE_WORKERS, max_pages=MAX_PAGES, session=None, allow_shrink=False):
+    # Any failed request, an empty result or one much smaller than the current
+    # dump raises ScrapeError before the dump is touched: a partial dump would
+    # look like machines disappearing to ingest and price history.
+    started = time.perf_counter()
+    session = session or make_session(workers)
+    cache = PageCache(cache_dir)
+
+    pages = [fetch_page(session, cache, start_url, 1)]
+    page_url, first_number = page_numbering(pages[0].next_url)
+    if page_url is not None:
+        pages += fetch_numbered(session, cache, page_url, first_number, workers, max_pages)
+    last = pages[-1]
+    # numbered pages ran out of step with the next links: walk the rest one by one
+    if last.next_url and last.number < max_pages and (page_url is None or last.next_url != page_url(last.number + 1)):
+        seen = {page.url for page in pages}
+        pages += follow_pages(session, cache, last.next_url, last.number + 1, max_pages, seen)
+    cache.save()
+
+    ids = [computer_id for page in pages for computer_id in page.ids]
+    unique = len(set(ids))
+    if not unique:
+        raise ScrapeError(f"На {start_url} не найдено ни одной карточки, {output_path} не тронут")
+    previous = count_dump_machines(output_path)
+    if not allow_shrink and unique < previous * MIN_KEEP_RATIO:
+        raise ScrapeError(
+            f"Найдено {unique} компьютеров против {previous} в {output_path}, дамп не тронут "
+            f"(--allow-shrink, если их правда стало меньше)"
+        )
+
+    changed = write_dump(output_path, [cache.page_path(page.url) for page in pages])
+    not_modified = sum(1 for page in pages if page.status == 304)
+    report = ScrapeReport(len(pages), unique, len(ids) - unique, not_modified, changed, time.perf_counter() - started)
+    chars = sum(page.chars for page in pages)
+    print(
+        f"Скачано {report.pages} страниц ({report.not_modified} без изменений, {chars / (1 << 20):.1f} МБ) "
+        f"за {report.seconds:.2f} с: компьютеров {report.cards}, повторов {report.duplicates}; "
+        f"{output_path} {'обновлён' if changed else 'не изменился'}"
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скачивание карточек с fogplay.mts.ru в дамп для ingest.py")
+    parser.add_argument('--url', default=os.getenv("FOGPLAY_URL", FOGPLAY_URL))
+    parser.add_argument('--output', default='cards.txt')
+    parser.add_argument('--cache-dir', default=SCRAPE_CACHE_DIR)
+    parser.add_argument('--workers', type=int, default=SCRAPE_WORKERS, help="сколько страниц качать одновременно")
+    parser.add_argument('--max-pages', type=int, default=MAX_PAGES)
+    parser.add_argument('--allow-shrink', action='store_true',
+                        help="записать дамп, даже если компьютеров стало меньше чем вдвое")
+    args = parser.parse_args()
+    try:
+        scrape(args.url, args.output, args.cache_dir, args.workers, args.max_pages, allow_shrink=args.allow_shrink)
+    except ScrapeError as e:
+        print(e)
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+
+SEARCH_FIELDS = ('cpu', 'gpu', 'ram')
+
+RUN_RE = re.compile(r'[0-9a-zа-яё]+')
+SPLIT_RE = re.compile(r'[a-zа-яё]+|[0-9]+')
+
+
+def query_runs(text):
+    return RUN_RE.findall(text.lower())
+
+
+def index_tokens(text):
+    # "RTX4060", "RTX 4060", "16GB" and "16 Gb" must all meet: index every
+    # alphanumeric run, its letter/digit pieces, and each pair of adjacent runs
+    # glued together. Queries then prefix-match their runs against these.
+    runs = query_runs(text)
+    tokens = set(runs)
+    for run in runs:
+        pieces = SPLIT_RE.findall(run)
+        if len(pieces) > 1:
+            tokens.update(pieces)
+    for left, right in zip(runs, runs[1:]):
+        tokens.add(left + right)
+    return tokens
+
+
+@lru_cache(maxsize=4096)
+def normalized_text(text):
+    # (spaced, glued) forms of a field; the few distinct CPU/GPU/RAM names repeat a lot
+    runs = query_runs(text)
+    return ' '.join(runs), ''.join(runs)
+
+
+def phrase_matches(runs, text):
+    # the runs must follow each other in the text, as the old substring scan
+    # required: "ryzen 5" must not match "Ryzen 7 5700X"
+    spaced, glued = normalized_text(text)
+    return ' '.join(runs) in spaced or ''.join(runs) in glued
+
+
+class TokenIndex:
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+
+    @classmethod
+    def from_parts(cls, postings, vocabulary):
+        # postings may be any mapping of token -> card ids (see snapshot_file)
+        token_index = cls()
+        token_index.postings = postings
+        token_index.vocabulary = vocabulary
+        return token_index
+
+    def add(self, card_id, tokens):
+        for token in tokens:
+            self.postings.setdefault(token, []).append(card_id)
+
+    def freeze(self):
+        self.vocabulary = sorted(self.postings)
+
+    def prefix_matches(self, prefix):
+        matched = set()
+        vocabulary = self.vocabulary
+        position = bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            matched.update(self.postings[vocabulary[position]])
+            position += 1
+        return matched
+
+    def match_all(self, runs):
+        result = None
+        # rarest-looking (longest) runs first keeps the running intersection small
+        for run in sorted(runs, key=len, reverse=True):
+            ids = self.prefix_matches(run)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result if result is not None else set()
+
+
+class SearchIndex:
+    def __init__(self, cards):
+        self.cards = cards
+        self.fields = {field: TokenIndex() for field in SEARCH_FIELDS}
+        self.combined = TokenIndex()
+
+        for card_id, card in enumerate(cards):
+            combined_tokens = set()
+            for field in SEARCH_FIELDS:
+                tokens = index_tokens(getattr(card, field))
+                self.fields[field].add(card_id, tokens)
+                combined_tokens.update(tokens)
+            self.combined.add(card_id, combined_tokens)
+
+        for token_index in self.fields.values():
+            token_index.freeze()
+        self.combined.freeze()
+
+    @classmethod
+    def from_parts(cls, cards, fields, combined):
+        search_index = cls.__new__(cls)
+        search_index.cards = cards
+        search_index.fields = fields
+        search_index.combined = combined
+        return search_index
+
+    def search_component(self, component_type, query):
+        token_index = self.fields.get(component_type)
+        runs = query_runs(query)
+        if token_index is None or not runs:
+            return []
+        # the token index narrows the candidates, the phrase check keeps the words adjacent
+        card_ids = sorted(token_index.match_all(runs))
+        if len(runs) > 1:
+            card_ids = [card_id for card_id in card_ids
+                        if phrase_matches(runs, getattr(self.cards[card_id], component_type))]
+        return [self.cards[card_id] for card_id in card_ids]
+
+    def _combined_text(self, card_id):
+        card = self.cards[card_id]
+        return f"{card.cpu} {card.gpu} {card.ram}"
+
+    def search_full_config(self, query):
+        query_parts = [runs for runs in (query_runs(part) for part in query.split()) if runs]
+        if not query_parts:
+            return []
+
+        matches = Counter()
+        for runs in query_parts:
+            card_ids = self.combined.match_all(runs)
+            if len(runs) > 1:
+                card_ids = [card_id for card_id in card_ids if phrase_matches(runs, self._combined_text(card_id))]
+            matches.update(card_ids)
+
+        # same rule as the old linear scan: at least half of the words must match,
+        # best score first, ties in dataset order
+        needed = len(query_parts) / 2
+        ranked = sorted(
+            (card_id for card_id, count in matches.items() if count >= needed),
+            key=lambda card_id: (-matches[card_id], card_id),
+        )
+        return [self.cards[card_id] for card_id in ranked]
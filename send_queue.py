@@ -0,0 +1,198 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# Telegram allows about 30 messages per second overall and roughly one per
+# second in a single chat, with short bursts tolerated
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+SEND_WORKERS = 4
+MAX_RETRIES = 5
+BUCKET_SWEEP_EVERY = 500
+
+
+def retry_after_seconds(error):
+    # ApiTelegramException for a 429 carries parameters.retry_after
+    if getattr(error, 'error_code', None) != 429:
+        return None
+    result_json = getattr(error, 'result_json', None) or {}
+    return (result_json.get('parameters') or {}).get('retry_after', 1)
+
+
+class TokenBucket:
+    # reserve() always takes a token and says how long to wait before using it,
+    # so concurrent callers queue up behind each other instead of racing
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def is_full(self):
+        with self._lock:
+            self._refill()
+            return self._tokens >= self.capacity
+
+
+class SendJob:
+    __slots__ = ('calls', 'future')
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.future = Future()
+
+
+class SendQueue:
+    # Outbound Telegram calls go through per-chat FIFOs served by a few worker
+    # threads. A chat is handled by one worker at a time, so the parts of a
+    # batch (and consecutive batches) arrive in order.
+    def __init__(self, workers=SEND_WORKERS, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 chat_burst=CHAT_BURST, max_retries=MAX_RETRIES, sleep=time.sleep, clock=time.monotonic):
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._sleep = sleep
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_rate, clock)
+        self._buckets = {}
+        self._chats = {}
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._submitted = 0
+        self._closed = False
+        self._threads = []
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'send-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, chat_id, func, *args, **kwargs):
+        return self.submit_batch(chat_id, [(func, args, kwargs)])
+
+    def submit_batch(self, chat_id, calls):
+        # calls: [(func, args, kwargs), ...] sent back to back; the future gets their results
+        self.start()
+        job = SendJob(list(calls))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("send queue is shut down")
+            jobs = self._chats.get(chat_id)
+            if jobs is None:
+                jobs = self._chats[chat_id] = deque()
+                self._ready.put(chat_id)
+            jobs.append(job)
+            self._pending += 1
+            self._submitted += 1
+            if self._submitted % BUCKET_SWEEP_EVERY == 0:
+                self._sweep_buckets()
+        return job.future
+
+    def _sweep_buckets(self):
+        # a refilled bucket for an idle chat is the same as no bucket
+        for chat_id in [chat_id for chat_id, bucket in self._buckets.items()
+                        if chat_id not in self._chats and bucket.is_full()]:
+            del self._buckets[chat_id]
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, self._clock)
+            return bucket
+
+    def _work(self):
+        while True:
+            chat_id = self._ready.get()
+            if chat_id is None:
+                return
+            with self._lock:
+                job = self._chats[chat_id].popleft()
+            self._run(chat_id, job)
+            with self._lock:
+                self._pending -= 1
+                if self._chats[chat_id]:
+                    self._ready.put(chat_id)
+                else:
+                    del self._chats[chat_id]
+                if self._pending == 0:
+                    self._idle.notify_all()
+
+    def _run(self, chat_id, job):
+        results = []
+        try:
+            for func, args, kwargs in job.calls:
+                results.append(self._call(chat_id, func, args, kwargs))
+        except Exception as e:
+            logging.error(f"Telegram send to chat {chat_id} failed: {e}")
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(results)
+
+    def _call(self, chat_id, func, args, kwargs):
+        bucket = self._chat_bucket(chat_id)
+        attempt = 0
+        while True:
+            wait = max(bucket.reserve(), self._global.reserve())
+            if wait > 0:
+                self._sleep(wait)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logging.warning(f"Telegram 429 for chat {chat_id}, retrying in {retry_after}s")
+                bucket.pause(retry_after)
+
+    def drain(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self, wait=True, timeout=None):
+        with self._lock:
+            self._closed = True
+        drained = self.drain(timeout) if wait else False
+        for _ in self._threads:
+            self._ready.put(None)
+        return drained
@@ -0,0 +1,250 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+from range_query import RANGE_COLUMNS, RangeIndex
+from records import CardRecord
+from search_index import SEARCH_FIELDS, SearchIndex, TokenIndex
+
+DATASET_SNAPSHOT_FILE = 'dataset_snapshot.bin'
+
+# Layout: MAGIC, uint32 format version, uint32 header length, JSON header, then
+# 4-byte aligned sections of native-endian 32-bit arrays described by the header.
+# Bump SNAPSHOT_FORMAT_VERSION whenever the sections or the record parsing change.
+MAGIC = b'FOGSNAP\0'
+SNAPSHOT_FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<8sII')
+NONE_VALUE = -2 ** 31
+TOKEN_INDEXES = SEARCH_FIELDS + ('combined',)
+
+
+class SnapshotFormatError(ValueError):
+    pass
+
+
+class StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def add(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def sections(self):
+        offsets = array('I', [0])
+        blob = bytearray()
+        for text in self.strings:
+            blob += text.encode('utf-8')
+            offsets.append(len(blob))
+        return {'strings.offsets': offsets, 'strings.blob': bytes(blob)}
+
+
+class MappedPostings(Mapping):
+    # token -> slice of the mapped postings array; the vocabulary is sorted,
+    # so lookups bisect instead of materialising a dict per index
+    def __init__(self, vocabulary, offsets, postings):
+        self._vocabulary = vocabulary
+        self._offsets = offsets
+        self._postings = postings
+
+    def _position(self, token):
+        position = bisect_left(self._vocabulary, token)
+        if position == len(self._vocabulary) or self._vocabulary[position] != token:
+            raise KeyError(token)
+        return position
+
+    def __getitem__(self, token):
+        position = self._position(token)
+        return self._postings[self._offsets[position]:self._offsets[position + 1]]
+
+    def __iter__(self):
+        return iter(self._vocabulary)
+
+    def __len__(self):
+        return len(self._vocabulary)
+
+
+def _optional_int(value):
+    return NONE_VALUE if value is None else value
+
+
+def _from_optional_int(value):
+    return None if value == NONE_VALUE else value
+
+
+def _record_sections(records, strings):
+    record_strings = array('I')
+    record_numbers = array('i')
+    for record in records:
+        record_strings.extend(strings.add(text) for text in (record.cpu, record.gpu, record.ram, record.price))
+        record_numbers.extend(
+            _optional_int(value)
+            for value in (record.price_value, record.ram_gb, record.vram_mb, record.cpu_cores)
+        )
+    return {'records.strings': record_strings, 'records.numbers': record_numbers}
+
+
+def _token_sections(name, token_index, strings):
+    vocabulary = array('I')
+    offsets = array('I', [0])
+    postings = array('I')
+    for token in token_index.vocabulary:
+        vocabulary.append(strings.add(token))
+        postings.extend(token_index.postings[token])
+        offsets.append(len(postings))
+    return {
+        f'tokens.{name}.vocabulary': vocabulary,
+        f'tokens.{name}.offsets': offsets,
+        f'tokens.{name}.postings': postings,
+    }
+
+
+def save_snapshot(path, records, search_index, range_index, source_key):
+    strings = StringTable()
+    sections = _record_sections(records, strings)
+    for name in TOKEN_INDEXES:
+        token_index = search_index.combined if name == 'combined' else search_index.fields[name]
+        sections.update(_token_sections(name, token_index, strings))
+    for column in RANGE_COLUMNS:
+        sections[f'range.{column}.values'] = array('i', range_index.values[column])
+        sections[f'range.{column}.ids'] = array('I', range_index.ids[column])
+    sections.update(strings.sections())
+
+    payloads = {}
+    layout = {}
+    offset = 0
+    checksum = 0
+    for name, data in sections.items():
+        if isinstance(data, array):
+            raw, typecode = data.tobytes(), data.typecode
+        else:
+            raw, typecode = data, 'B'
+        layout[name] = [offset, len(raw), typecode]
+        payload = raw + b'\0' * (-len(raw) % 4)
+        payloads[name] = payload
+        checksum = zlib.crc32(payload, checksum)
+        offset += len(payload)
+
+    header = json.dumps({
+        'byteorder': sys.byteorder,
+        'records': len(records),
+        'checksum': checksum,
+        'source_key': source_key,
+        'sections': layout,
+    }, ensure_ascii=False).encode('utf-8')
+    header += b' ' * (-(PREAMBLE.size + len(header)) % 4)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, SNAPSHOT_FORMAT_VERSION, len(header)))
+        f.write(header)
+        for payload in payloads.values():
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class LoadedSnapshot:
+    # Keeps the mapping alive: indexes hand out memoryview slices into it, and
+    # os.replace() on a rebuild leaves the mapped inode intact.
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, format_version, header_length = PREAMBLE.unpack_from(self._view)
+        if magic != MAGIC:
+            raise SnapshotFormatError("не файл снимка")
+        if format_version != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotFormatError(f"версия формата {format_version}, нужна {SNAPSHOT_FORMAT_VERSION}")
+        header_end = PREAMBLE.size + header_length
+        self.header = json.loads(bytes(self._view[PREAMBLE.size:header_end]).decode('utf-8'))
+        if self.header['byteorder'] != sys.byteorder:
+            raise SnapshotFormatError("снимок записан на машине с другим порядком байт")
+        self._data_start = header_end
+        if zlib.crc32(self._view[header_end:]) != self.header['checksum']:
+            raise SnapshotFormatError("контрольная сумма не совпадает")
+
+    def source_key(self):
+        # None for snapshots written before the key carried the source state
+        return self.header.get('source_key')
+
+    def section(self, name):
+        offset, length, typecode = self.header['sections'][name]
+        start = self._data_start + offset
+        if start + length > len(self._view):
+            raise SnapshotFormatError(f"секция {name} обрезана")
+        return self._view[start:start + length].cast(typecode)
+
+    def strings(self):
+        offsets = self.section('strings.offsets')
+        blob = self.section('strings.blob')
+        return [
+            sys.intern(bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8'))
+            for i in range(len(offsets) - 1)
+        ]
+
+    def build(self):
+        strings = self.strings()
+        record_strings = self.section('records.strings')
+        record_numbers = self.section('records.numbers')
+        records = tuple(
+            CardRecord(
+                *(strings[string_id] for string_id in record_strings[i:i + 4]),
+                *(_from_optional_int(value) for value in record_numbers[i:i + 4]),
+            )
+            for i in range(0, len(record_strings), 4)
+        )
+        if len(records) != self.header['records']:
+            raise SnapshotFormatError("число карточек не совпадает с заголовком")
+
+        token_indexes = {}
+        for name in TOKEN_INDEXES:
+            vocabulary = [strings[string_id] for string_id in self.section(f'tokens.{name}.vocabulary')]
+            postings = MappedPostings(
+                vocabulary,
+                self.section(f'tokens.{name}.offsets'),
+                self.section(f'tokens.{name}.postings'),
+            )
+            token_indexes[name] = TokenIndex.from_parts(postings, vocabulary)
+        combined = token_indexes.pop('combined')
+        search_index = SearchIndex.from_parts(records, token_indexes, combined)
+
+        range_index = RangeIndex.from_parts(
+            records,
+            {column: self.section(f'range.{column}.values') for column in RANGE_COLUMNS},
+            {column: self.section(f'range.{column}.ids') for column in RANGE_COLUMNS},
+        )
+        return records, search_index, range_index
+
+
+def load_snapshot(path, source_key):
+    # (records, search_index, range_index) when the snapshot was built from the
+    # same sources ({'files': content hashes, 'state': ...}), else None
+    try:
+        loaded = LoadedSnapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        print(f"Снимок {path} не читается, пересобираем: {e}")
+        return None
+
+    if loaded.source_key() != source_key:
+        print(f"Снимок {path} устарел, пересобираем")
+        return None
+    try:
+        return loaded.build()
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        print(f"Снимок {path} повреждён, пересобираем: {e}")
+        return None
@@ -0,0 +1,315 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from card_parser import iter_card_blocks, iter_cards, iter_file_chunks
+from dataset import file_content_hash
+from ingest import IngestReport, block_hash, generate_card_key, read_json
+from metrics import metrics
+from records import CardRecord
+from search_index import index_tokens, phrase_matches, query_runs
+
+CARDS_DB_FILE = 'cards.db'
+LEGACY_ID_PREFIX = 'json:'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    config_key TEXT NOT NULL,
+    cpu TEXT NOT NULL DEFAULT '',
+    gpu TEXT NOT NULL DEFAULT '',
+    ram TEXT NOT NULL DEFAULT '',
+    price TEXT NOT NULL DEFAULT '',
+    price_value INTEGER,
+    ram_gb INTEGER,
+    vram_mb INTEGER,
+    cpu_cores INTEGER,
+    seq INTEGER NOT NULL,
+    cpu_tokens TEXT NOT NULL DEFAULT '',
+    gpu_tokens TEXT NOT NULL DEFAULT '',
+    -- ingest.block_hash of the machine's markup, so unchanged blocks are not parsed again
+    block_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS cards_config_key ON cards(config_key);
+CREATE INDEX IF NOT EXISTS cards_price_value ON cards(price_value);
+CREATE INDEX IF NOT EXISTS cards_ram_gb ON cards(ram_gb);
+CREATE INDEX IF NOT EXISTS cards_vram_mb ON cards(vram_mb);
+CREATE INDEX IF NOT EXISTS cards_cpu_cores ON cards(cpu_cores);
+CREATE INDEX IF NOT EXISTS cards_seq ON cards(seq);
+
+-- indexes the same tokens as search_index.index_tokens, not the raw names,
+-- so "rtx4060" and "rtx 4060" find the same cards as the in-memory index
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_search USING fts5(
+    cpu_tokens, gpu_tokens, content='cards', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 0'
+);
+CREATE TRIGGER IF NOT EXISTS cards_search_insert AFTER INSERT ON cards BEGIN
+    INSERT INTO cards_search(rowid, cpu_tokens, gpu_tokens) VALUES (new.rowid, new.cpu_tokens, new.gpu_tokens);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_search_delete AFTER DELETE ON cards BEGIN
+    INSERT INTO cards_search(cards_search, rowid, cpu_tokens, gpu_tokens)
+    VALUES ('delete', old.rowid, old.cpu_tokens, old.gpu_tokens);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_search_update AFTER UPDATE OF cpu_tokens, gpu_tokens ON cards BEGIN
+    INSERT INTO cards_search(cards_search, rowid, cpu_tokens, gpu_tokens)
+    VALUES ('delete', old.rowid, old.cpu_tokens, old.gpu_tokens);
+    INSERT INTO cards_search(rowid, cpu_tokens, gpu_tokens) VALUES (new.rowid, new.cpu_tokens, new.gpu_tokens);
+END;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+-- bumped by every change to cards, including ones made outside the bot
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+CREATE TRIGGER IF NOT EXISTS cards_revision_insert AFTER INSERT ON cards BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'revision';
+END;
+CREATE TRIGGER IF NOT EXISTS cards_revision_delete AFTER DELETE ON cards BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'revision';
+END;
+CREATE TRIGGER IF NOT EXISTS cards_revision_update AFTER UPDATE ON cards
+WHEN old.cpu IS NOT new.cpu OR old.gpu IS NOT new.gpu OR old.ram IS NOT new.ram
+  OR old.price IS NOT new.price OR old.seq IS NOT new.seq BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'revision';
+END;
+"""
+
+UPSERT_SQL = """
+INSERT INTO cards (id, config_key, cpu, gpu, ram, price, price_value, ram_gb, vram_mb, cpu_cores, seq,
+                   cpu_tokens, gpu_tokens, block_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    config_key = excluded.config_key,
+    cpu = excluded.cpu,
+    gpu = excluded.gpu,
+    ram = excluded.ram,
+    price = excluded.price,
+    price_value = excluded.price_value,
+    ram_gb = excluded.ram_gb,
+    vram_mb = excluded.vram_mb,
+    cpu_cores = excluded.cpu_cores,
+    cpu_tokens = excluded.cpu_tokens,
+    gpu_tokens = excluded.gpu_tokens,
+    block_hash = excluded.block_hash
+WHERE cards.cpu IS NOT excluded.cpu
+   OR cards.gpu IS NOT excluded.gpu
+   OR cards.ram IS NOT excluded.ram
+   OR cards.price IS NOT excluded.price
+   OR cards.block_hash IS NOT excluded.block_hash
+"""
+
+CARD_COLUMNS = "cpu, gpu, ram, price"
+SEARCHABLE_FIELDS = ('cpu', 'gpu')
+
+def search_tokens(text):
+    return ' '.join(sorted(index_tokens(text)))
+
+
+class SQLiteCardStore:
+    def __init__(self, path=CARDS_DB_FILE, key_func=None):
+        self.path = path
+        self._key_func = key_func
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value)),
+        )
+
+    def revision(self):
+        with self._lock:
+            return int(self._meta('revision'))
+
+    def _row(self, card_id, card, seq, content_hash=None):
+        record = CardRecord.from_card(card)
+        return (
+            card_id, self._key_func(card), record.cpu, record.gpu, record.ram, record.price,
+            record.price_value, record.ram_gb, record.vram_mb, record.cpu_cores, seq,
+            search_tokens(record.cpu), search_tokens(record.gpu), content_hash,
+        )
+
+    def _next_seq(self):
+        return self._conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM cards").fetchone()[0]
+
+    def migrate_from_json(self, json_file):
+        with self._lock:
+            if self._meta('json_migrated'):
+                return 0
+            legacy_cards = read_json(json_file, [])
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._next_seq()
+                self._conn.executemany(UPSERT_SQL, (
+                    self._row(f"{LEGACY_ID_PREFIX}{position}", card, seq + position)
+                    for position, card in enumerate(legacy_cards)
+                ))
+                self._set_meta('json_migrated', json_file)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        print(f"Перенесено {len(legacy_cards)} карточек из {json_file} в {self.path}")
+        return len(legacy_cards)
+
+    def upsert_cards(self, cards_by_id, source_hash=None):
+        # cards_by_id is the whole dump: machines missing from it have left the site
+        with self._lock:
+            if source_hash is not None and self._meta('ingest_source_hash') == source_hash:
+                return 0
+            return self._apply_dump(
+                {card_id: (card, None) for card_id, card in cards_by_id.items()}, cards_by_id, source_hash
+            )
+
+    def _dump_hashes(self):
+        return dict(self._conn.execute(
+            f"SELECT id, block_hash FROM cards WHERE id NOT LIKE '{LEGACY_ID_PREFIX}%'"
+        ))
+
+    def _apply_dump(self, changed_cards, present_ids, source_hash):
+        # changed_cards: {id: (card, block hash)}; present_ids: every machine in the dump
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = self._dump_hashes()
+            seq = self._next_seq()
+            rows = []
+            for card_id, (card, content_hash) in changed_cards.items():
+                rows.append(self._row(card_id, card, seq, content_hash))
+                if card_id not in existing:
+                    seq += 1
+            changed = self._conn.executemany(UPSERT_SQL, rows).rowcount
+            departed = [(card_id,) for card_id in existing if card_id not in present_ids]
+            changed += self._conn.executemany("DELETE FROM cards WHERE id = ?", departed).rowcount
+            # legacy rows only stand in for machines we never saw with an ID
+            self._conn.execute(
+                f"DELETE FROM cards WHERE id LIKE '{LEGACY_ID_PREFIX}%' AND config_key IN "
+                f"(SELECT config_key FROM cards WHERE id NOT LIKE '{LEGACY_ID_PREFIX}%')"
+            )
+            if source_hash is not None:
+                self._set_meta('ingest_source_hash', source_hash)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return changed
+
+    def ingest_dump(self, html_path, history=None):
+        # ingest.ingest_cards for SQLite mode: the per-machine block hashes live in
+        # the table, so only changed blocks are parsed and only their rows written;
+        # no cards_by_id.json or checkpoint is rewritten
+        source_hash = file_content_hash(html_path)
+        if source_hash is None:
+            print(f"Файл не найден: {html_path}")
+            return IngestReport(0, 0, 0, 0, 0, 0, True)
+        with self._lock:
+            if self._meta('ingest_source_hash') == source_hash:
+                return IngestReport(0, 0, 0, 0, 0, 0, True)
+            known = self._dump_hashes()
+
+        started = time.perf_counter()
+        unchanged = parsed = duplicates = 0
+        seen = set()
+        changed_cards = {}
+        for computer_id, block in iter_card_blocks(iter_file_chunks(html_path)):
+            if not computer_id:
+                continue
+            if computer_id in seen:
+                duplicates += 1
+                continue
+            seen.add(computer_id)
+            content_hash = block_hash(block)
+            if known.get(computer_id) == content_hash:
+                unchanged += 1
+                continue
+            parsed += 1
+            card = next(iter_cards([block]), None)
+            if card is not None:
+                changed_cards[computer_id] = (card, content_hash)
+
+        with self._lock:
+            self._apply_dump(changed_cards, seen, source_hash)
+        added = sum(1 for computer_id in changed_cards if computer_id not in known)
+        removed = sum(1 for computer_id in known if computer_id not in seen)
+        report = IngestReport(added, len(changed_cards) - added, removed, unchanged, parsed, duplicates, False)
+        if history is not None:
+            history.record(self.dump_cards(), os.path.getmtime(html_path))
+
+        metrics.observe('fogplay_stage_seconds', time.perf_counter() - started, stage='ingest')
+        metrics.inc('fogplay_ingest_cards_total', parsed, result='parsed')
+        metrics.inc('fogplay_ingest_cards_total', unchanged, result='unchanged')
+        print(
+            f"Инжест {html_path} в {self.path}: добавлено {report.added}, обновлено {report.updated}, "
+            f"удалено {report.removed}, без изменений {report.unchanged}, "
+            f"разобрано {report.parsed}, повторов {report.duplicates}"
+        )
+        return report
+
+    def dump_cards(self):
+        # {computer id: card} for the machines of the last dump, without legacy rows
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, {CARD_COLUMNS} FROM cards WHERE id NOT LIKE '{LEGACY_ID_PREFIX}%' ORDER BY seq"
+            ).fetchall()
+        return {card_id: {'cpu': cpu, 'gpu': gpu, 'ram': ram, 'price': price} for card_id, cpu, gpu, ram, price in rows}
+
+    def load_cards(self):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {CARD_COLUMNS} FROM cards ORDER BY seq").fetchall()
+        return [{'cpu': cpu, 'gpu': gpu, 'ram': ram, 'price': price} for cpu, gpu, ram, price in rows]
+
+    def search(self, field, query):
+        if field not in SEARCHABLE_FIELDS:
+            raise ValueError(f"Поиск по {field} в SQLite не поддерживается")
+        runs = query_runs(query)
+        if not runs:
+            return []
+        # same rules as SearchIndex.search_component: every run prefixes a token,
+        # then the phrase check keeps the words adjacent
+        match = f"{field}_tokens : (" + ' AND '.join(f'"{run}"*' for run in runs) + ")"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.cpu, c.gpu, c.ram, c.price FROM cards_search "
+                "JOIN cards c ON c.rowid = cards_search.rowid "
+                "WHERE cards_search MATCH ? ORDER BY c.seq",
+                (match,),
+            ).fetchall()
+        records = [
+            CardRecord.from_card({'cpu': cpu, 'gpu': gpu, 'ram': ram, 'price': price})
+            for cpu, gpu, ram, price in rows
+        ]
+        if len(runs) > 1:
+            records = [record for record in records if phrase_matches(runs, getattr(record, field))]
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос cards_data.json в SQLite")
+    parser.add_argument('json_file', nargs='?', default='cards_data.json')
+    parser.add_argument('--db', default=CARDS_DB_FILE)
+    args = parser.parse_args()
+
+    store = SQLiteCardStore(args.db, key_func=generate_card_key)
+    if not store.migrate_from_json(args.json_file):
+        print(f"{args.db} уже содержит данные из JSON, перенос пропущен")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
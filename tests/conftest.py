@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+import telebot
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture
+def api():
+    # a FakeBotAPI that telebot talks to for the duration of the test
+    from fake_bot_api import FakeBotAPI
+
+    fake = FakeBotAPI(retry_after=1).start()
+    previous = telebot.apihelper.API_URL
+    telebot.apihelper.API_URL = fake.api_url
+    yield fake
+    telebot.apihelper.API_URL = previous
+    fake.stop()
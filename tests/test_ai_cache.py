@@ -0,0 +1,54 @@
+from ai_cache import AIResponseCache
+from ai_runtime import AIRuntime
+from fake_genai import FakeGenerativeModel
+
+
+def ask_many(cache, model, prompts):
+    runtime = AIRuntime(max_concurrency=4, max_pending=64)
+    answers, errors = [], []
+
+    def ask(prompt):
+        async def compute():
+            response = await runtime.run_blocking(model.start_chat().send_message, prompt)
+            return response.text
+        return cache.get_or_compute('dataset', prompt, compute)
+
+    for prompt in prompts:
+        runtime.submit(lambda prompt=prompt: ask(prompt), answers.append, errors.append)
+    assert runtime.drain(timeout=10)
+    runtime.shutdown()
+    assert errors == []
+    return answers
+
+
+def test_identical_requests_share_one_model_call():
+    cache = AIResponseCache()
+    model = FakeGenerativeModel(delay=0.2)
+    answers = ask_many(cache, model, ['Лучший ПК до 50 ₽?'] * 10)
+    assert model.calls == 1
+    assert len(answers) == 10 and len(set(answers)) == 1
+    assert (cache.misses, cache.coalesced + cache.hits) == (1, 9)
+
+
+def test_answers_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'ai_cache.json')
+    model = FakeGenerativeModel(delay=0)
+    cache = AIResponseCache(disk_path=path, flush_delay=60)
+    first = ask_many(cache, model, ['rtx 4060', 'RTX  4060', 'ryzen 5'])
+    cache.flush()
+
+    reloaded = AIResponseCache(disk_path=path)
+    again = ask_many(reloaded, model, ['rtx 4060', 'ryzen 5'])
+    assert model.calls == 2
+    assert sorted(again) == sorted(set(first))
+    assert reloaded.hits == 2
+
+
+def test_put_does_not_write_on_the_caller(tmp_path):
+    path = tmp_path / 'ai_cache.json'
+    cache = AIResponseCache(disk_path=str(path), flush_delay=0.05)
+    cache.put('key', 'text')
+    timer = cache._flush_timer
+    assert not path.exists()
+    timer.join(5)
+    assert AIResponseCache(disk_path=str(path)).get('key') == 'text'
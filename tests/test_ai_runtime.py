@@ -0,0 +1,57 @@
+import threading
+import time
+
+from ai_runtime import AIRuntime
+
+
+class BlockingSDK:
+    # stands in for chat.send_message: blocks its thread and counts overlapping calls
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def send_message(self, prompt):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.seconds)
+        with self.lock:
+            self.active -= 1
+        return prompt
+
+
+def test_timed_out_calls_keep_their_slot():
+    runtime = AIRuntime(max_concurrency=2, timeout=0.05, workers=8)
+    sdk = BlockingSDK(0.3)
+    errors = []
+    for i in range(6):
+        runtime.submit(lambda i=i: runtime.run_blocking(sdk.send_message, i), None, errors.append)
+    assert runtime.drain(timeout=5)
+    runtime.shutdown()
+    assert sdk.peak == 2
+    assert len(errors) == 6 and all(isinstance(e, TimeoutError) for e in errors)
+
+
+def test_delivery_runs_off_the_sdk_pool():
+    runtime = AIRuntime(max_concurrency=1, workers=1)
+    sdk = BlockingSDK(0.2)
+    delivered = []
+
+    async def ask(prompt):
+        return await runtime.run_blocking(sdk.send_message, prompt)
+
+    def on_result(result):
+        delivered.append((result, threading.current_thread().name))
+        # a slow Telegram reply must not hold up the next SDK call
+        time.sleep(0.5)
+
+    started = time.perf_counter()
+    runtime.submit(lambda: ask('a'), on_result, None)
+    runtime.submit(lambda: ask('b'), on_result, None)
+    assert runtime.drain(timeout=5)
+    runtime.shutdown()
+    assert [result for result, _ in delivered] == ['a', 'b']
+    assert all(name.startswith('ai-deliver') for _, name in delivered)
+    assert time.perf_counter() - started < 1.2
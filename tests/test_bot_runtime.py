@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+import telebot
+
+from bot_runtime import WEBHOOK_PATH, BotRuntime
+
+
+def slow_bot(handled, started, seconds=0.3):
+    bot = telebot.TeleBot('123456:TEST', threaded=False)
+
+    @bot.message_handler(func=lambda message: True)
+    def handle(message):
+        started.set()
+        time.sleep(seconds)
+        handled.append(message.text)
+
+    return bot
+
+
+def test_shutdown_finishes_running_handlers_and_confirms_them(api):
+    handled, started = [], threading.Event()
+    bot = slow_bot(handled, started)
+    for i in range(4):
+        api.push_message(1, f"m{i}")
+    runtime = BotRuntime(bot, workers=2, poll_timeout=1)
+    runtime.start_polling()
+    assert started.wait(5)
+
+    assert runtime.shutdown(timeout=10)
+    assert handled
+    # handled updates are confirmed; the ones shutdown kept out of the pool
+    # are redelivered after a restart, so nothing is lost or handled twice
+    redelivered = [update.message.text for update in bot.get_updates(timeout=5, long_polling_timeout=1)]
+    assert sorted(handled + redelivered) == ['m0', 'm1', 'm2', 'm3']
+
+
+def test_shutdown_gives_up_after_timeout(api):
+    handled, started = [], threading.Event()
+    bot = slow_bot(handled, started, seconds=2)
+    api.push_message(1, 'slow')
+    runtime = BotRuntime(bot, workers=1, poll_timeout=1)
+    runtime.start_polling()
+    assert started.wait(5)
+    began = time.monotonic()
+    assert not runtime.shutdown(timeout=0.2)
+    assert time.monotonic() - began < 1.5
+
+
+def test_webhook_refuses_updates_once_stopping(api):
+    handled, started = [], threading.Event()
+    bot = slow_bot(handled, started, seconds=0)
+    runtime = BotRuntime(bot, workers=1)
+    runtime.start_webhook(None, port=0)
+    url = f"http://127.0.0.1:{runtime._server.server_address[1]}{WEBHOOK_PATH}"
+    update = api.push_message(1, 'hook')
+
+    def post():
+        request = urllib.request.Request(url, json.dumps(update).encode('utf-8'),
+                                         {'Content-Type': 'application/json'})
+        return urllib.request.urlopen(request, timeout=5).status
+
+    assert post() == 200
+    runtime.stop()
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post()
+    assert error.value.code == 503
+    assert runtime.shutdown(timeout=5)
+    assert handled == ['hook']
@@ -0,0 +1,45 @@
+from dataset import DatasetStore
+
+CARD = {'cpu': 'Intel Core i5-12400F', 'gpu': 'NVIDIA GeForce RTX 4060 8188 Mb', 'ram': '16 Gb', 'price': '50 ₽'}
+
+
+def make_store(tmp_path, cards, state):
+    source = tmp_path / 'cards.txt'
+    source.write_text('dump', encoding='utf-8')
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return cards
+
+    store = DatasetStore(loader, [str(source)], snapshot_path=str(tmp_path / 'snapshot.bin'),
+                         source_state=lambda: dict(state))
+    return store, loads
+
+
+def test_snapshot_is_reused_for_the_same_state(tmp_path):
+    store, _ = make_store(tmp_path, [CARD], {'storage': 'json'})
+    store.snapshot()
+    cold, loads = make_store(tmp_path, [], {'storage': 'json'})
+    assert len(cold.snapshot().cards) == 1
+    assert loads == []
+
+
+def test_snapshot_of_another_storage_is_not_served(tmp_path):
+    store, _ = make_store(tmp_path, [CARD], {'storage': 'json'})
+    store.snapshot()
+    cold, loads = make_store(tmp_path, [CARD, CARD], {'storage': 'sqlite', 'revision': 1})
+    assert len(cold.snapshot().cards) == 2
+    assert loads == [1]
+
+
+def test_state_change_triggers_a_refresh(tmp_path):
+    state = {'storage': 'sqlite', 'revision': 1}
+    store, loads = make_store(tmp_path, [CARD], state)
+    first = store.snapshot()
+    assert not store.refresh()
+    state['revision'] = 2
+    assert store.refresh()
+    assert store.snapshot().version == first.version + 1
+    assert store.snapshot().fingerprint != first.fingerprint
+    assert loads == [1, 1]
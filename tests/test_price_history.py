@@ -0,0 +1,26 @@
+import os
+import shutil
+
+from conftest import REPO_DIR
+from price_history import PriceHistory
+
+
+def load_history(tmp_path):
+    path = tmp_path / 'price_history.json'
+    shutil.copy(os.path.join(REPO_DIR, 'price_history.json'), path)
+    return PriceHistory(str(path))
+
+
+def test_phrase_excludes_longer_names(tmp_path):
+    history = load_history(tmp_path)
+    super_machines = history._matching('RTX 4070 SUPER')
+    assert super_machines
+    assert not any('Ti' in machine.gpu for machine in super_machines)
+    assert all('4070 SUPER' in machine.gpu for machine in super_machines)
+
+
+def test_words_stay_adjacent(tmp_path):
+    history = load_history(tmp_path)
+    ryzen_5 = history._matching('ryzen 5')
+    assert ryzen_5
+    assert all('Ryzen 5' in machine.cpu for machine in ryzen_5)
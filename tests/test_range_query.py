@@ -0,0 +1,38 @@
+import json
+import os
+
+from conftest import REPO_DIR
+from range_query import RangeFilter, RangeIndex, parse_range_query
+from records import build_records
+
+
+def load_index():
+    with open(os.path.join(REPO_DIR, 'cards_data.json'), 'r', encoding='utf-8') as f:
+        return RangeIndex(build_records(json.load(f)))
+
+
+def count(index, text):
+    return len(index.query(parse_range_query(text)))
+
+
+def test_strict_vram_bounds_split_the_nominal_size():
+    index = load_index()
+    below, exact, above = count(index, 'vram < 8'), count(index, 'vram = 8'), count(index, 'vram > 8')
+    assert below + exact + above == len(index.cards)
+    assert count(index, 'vram <= 8') == below + exact
+    assert count(index, 'vram >= 8') == exact + above
+
+
+def test_strict_vram_bounds_exclude_the_size_itself():
+    index = load_index()
+    twelve = {id(card) for card in index.query(parse_range_query('vram = 12'))}
+    assert twelve
+    assert not twelve & {id(card) for card in index.query(parse_range_query('vram > 12'))}
+    assert not twelve & {id(card) for card in index.query(parse_range_query('vram < 12'))}
+
+
+def test_vram_gb_bounds():
+    assert parse_range_query('vram > 8') == [RangeFilter('vram_mb', 8193, None)]
+    assert parse_range_query('vram < 8') == [RangeFilter('vram_mb', None, 7781)]
+    assert parse_range_query('vram = 8') == [RangeFilter('vram_mb', 7782, 8192)]
+    assert parse_range_query('vram >= 8000 mb') == [RangeFilter('vram_mb', 8000, None)]
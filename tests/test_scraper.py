@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from card_parser import iter_card_blocks, iter_file_chunks
+from conftest import REPO_DIR
+from fake_fogplay import FakeFogplaySite
+from scraper import ScrapeError, scrape
+
+
+@pytest.fixture
+def site():
+    fake = FakeFogplaySite(os.path.join(REPO_DIR, 'cards.txt'), page_size=100).start()
+    yield fake
+    fake.stop()
+
+
+def card_ids(path):
+    return [computer_id for computer_id, _ in iter_card_blocks(iter_file_chunks(path))]
+
+
+def run(site, tmp_path, **kwargs):
+    return scrape(site.url, str(tmp_path / 'cards.txt'), str(tmp_path / 'cache'), workers=3, **kwargs)
+
+
+def test_rescrape_reuses_unchanged_pages(site, tmp_path):
+    first = run(site, tmp_path)
+    assert first.changed and first.not_modified == 0
+    assert card_ids(str(tmp_path / 'cards.txt')) == card_ids(os.path.join(REPO_DIR, 'cards.txt'))
+
+    del site.requests[:]
+    second = run(site, tmp_path)
+    assert not second.changed
+    assert second.not_modified == second.pages == first.pages
+    assert set(site.statuses()) <= {304, 404}
+
+
+def test_rescrape_fetches_only_the_changed_page(site, tmp_path):
+    first = run(site, tmp_path)
+    site.replace_page(2, site.pages[1][:-1])
+    del site.requests[:]
+    second = run(site, tmp_path)
+    assert second.changed
+    assert site.statuses().count(200) == 1
+    assert second.not_modified == first.pages - 1
+    blocks = list(iter_card_blocks(iter_file_chunks(str(tmp_path / 'cards.txt'))))
+    assert len(blocks) == sum(len(page) for page in site.pages)
+
+
+def test_empty_listing_leaves_the_dump_alone(site, tmp_path):
+    run(site, tmp_path)
+    dump = tmp_path / 'cards.txt'
+    before = dump.read_bytes()
+    site.pages = [[]]
+    with pytest.raises(ScrapeError):
+        run(site, tmp_path)
+    assert dump.read_bytes() == before
+
+
+def test_much_smaller_listing_needs_allow_shrink(site, tmp_path):
+    run(site, tmp_path)
+    dump = tmp_path / 'cards.txt'
+    before = dump.read_bytes()
+    site.pages = site.pages[:1]
+    with pytest.raises(ScrapeError):
+        run(site, tmp_path)
+    assert dump.read_bytes() == before
+    assert run(site, tmp_path, allow_shrink=True).changed
@@ -0,0 +1,29 @@
+import json
+import os
+
+from bench_search import check_parity, linear_component
+from conftest import REPO_DIR
+from records import build_records
+from search_index import SearchIndex
+
+
+def load_cards():
+    with open(os.path.join(REPO_DIR, 'cards_data.json'), 'r', encoding='utf-8') as f:
+        return build_records(json.load(f))
+
+
+def test_index_matches_linear_scan():
+    assert check_parity(load_cards()) == []
+
+
+def test_query_words_stay_adjacent():
+    cards = load_cards()
+    index = SearchIndex(cards)
+    ryzen_5 = index.search_component('cpu', 'ryzen 5')
+    assert ryzen_5 == linear_component(cards, 'cpu', 'ryzen 5')
+    assert not any('Ryzen 7' in card.cpu or 'Ryzen 9' in card.cpu for card in ryzen_5)
+
+
+def test_glued_query_still_matches():
+    index = SearchIndex(load_cards())
+    assert index.search_component('gpu', 'rtx4060') == index.search_component('gpu', 'rtx 4060')
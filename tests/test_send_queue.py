@@ -0,0 +1,40 @@
+import telebot
+
+from send_queue import SendQueue
+
+
+def test_messages_arrive_in_order_through_429s(api):
+    api.chat_limit = 3
+    bot = telebot.TeleBot('123456:TEST', threaded=False)
+    # looser than the fake's limit, so Telegram's 429s do the throttling
+    outbox = SendQueue(chat_rate=10, chat_burst=10)
+    futures = {chat_id: [outbox.submit(chat_id, bot.send_message, chat_id, f"{chat_id}:{i}") for i in range(6)]
+               for chat_id in (1, 2)}
+    assert outbox.shutdown(timeout=20)
+
+    assert api.rejected > 0
+    for chat_id, chat_futures in futures.items():
+        messages = [future.result()[0] for future in chat_futures]
+        assert [message.text for message in messages] == [f"{chat_id}:{i}" for i in range(6)]
+        # the fake numbers messages as it accepts them
+        message_ids = [message.message_id for message in messages]
+        assert message_ids == sorted(message_ids)
+
+
+def test_batch_parts_stay_together(api):
+    api.chat_limit = 3
+    bot = telebot.TeleBot('123456:TEST', threaded=False)
+    outbox = SendQueue(chat_rate=10, chat_burst=10)
+    first = outbox.submit_batch(7, [(bot.send_message, (7, f"a{i}"), {}) for i in range(4)])
+    second = outbox.submit(7, bot.send_message, 7, "b")
+    assert outbox.shutdown(timeout=20)
+    assert [message.text for message in first.result() + second.result()] == ['a0', 'a1', 'a2', 'a3', 'b']
+
+
+def test_inline_query_answers_are_emulated(api):
+    bot = telebot.TeleBot('123456:TEST', threaded=False)
+    update = api.push_inline_query(5, 'rtx 4060')
+    result = telebot.types.InlineQueryResultArticle(
+        '1', 'RTX 4060', telebot.types.InputTextMessageContent('RTX 4060'))
+    assert bot.answer_inline_query(update['inline_query']['id'], [result], cache_time=1)
+    assert api.calls_to('answerInlineQuery')[0]['inline_query_id'] == update['inline_query']['id']
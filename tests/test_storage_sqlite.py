@@ -0,0 +1,69 @@
+import json
+import os
+
+from card_parser import iter_card_blocks, iter_file_chunks
+from conftest import REPO_DIR
+from ingest import generate_card_key
+from records import build_records
+from search_index import SearchIndex
+from storage_sqlite import SQLiteCardStore
+
+QUERIES = [
+    ('gpu', 'rtx4060'),
+    ('gpu', 'rtx 4060'),
+    ('gpu', 'RTX 4060 Ti'),
+    ('gpu', '4060'),
+    ('gpu', 'rx 6900 xt'),
+    ('cpu', 'ryzen 5'),
+    ('cpu', 'i5-12400F'),
+    ('cpu', 'i512400f'),
+    ('cpu', 'intel core i'),
+]
+
+
+def make_store(tmp_path):
+    store = SQLiteCardStore(str(tmp_path / 'cards.db'), key_func=generate_card_key)
+    with open(os.path.join(REPO_DIR, 'cards_data.json'), 'r', encoding='utf-8') as f:
+        cards = json.load(f)
+    store.upsert_cards({str(card_id): card for card_id, card in enumerate(cards)})
+    return store
+
+
+def test_fts_matches_in_memory_index(tmp_path):
+    store = make_store(tmp_path)
+    index = SearchIndex(build_records(store.load_cards()))
+    for field, query in QUERIES:
+        assert store.search(field, query) == index.search_component(field, query), query
+    assert store.search('gpu', 'rtx4060')
+
+
+
+def test_departed_machines_are_deleted(tmp_path):
+    store = SQLiteCardStore(str(tmp_path / 'cards.db'), key_func=generate_card_key)
+    cards = {str(card_id): {'cpu': f"CPU {card_id}", 'gpu': 'GPU', 'ram': '16 Gb', 'price': f"{card_id} ₽"}
+             for card_id in range(10)}
+    store.upsert_cards(cards)
+    del cards['3'], cards['7']
+    assert store.upsert_cards(cards) == 2
+    assert [card['cpu'] for card in store.load_cards()] == [f"CPU {card_id}" for card_id in range(10) if card_id not in (3, 7)]
+
+
+def test_ingest_dump_parses_only_changed_blocks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    blocks = list(iter_card_blocks(iter_file_chunks(os.path.join(REPO_DIR, 'cards.txt'))))
+    unique = {computer_id for computer_id, _ in blocks if computer_id}
+    dump = tmp_path / 'cards.txt'
+    dump.write_text(''.join(block for _, block in blocks), encoding='utf-8')
+    store = SQLiteCardStore(str(tmp_path / 'cards.db'), key_func=generate_card_key)
+
+    first = store.ingest_dump(str(dump))
+    assert first.added == len(unique) == len(store.load_cards())
+    assert store.ingest_dump(str(dump)).skipped
+
+    gone = blocks[0][0]
+    dump.write_text(''.join(block for computer_id, block in blocks if computer_id != gone), encoding='utf-8')
+    second = store.ingest_dump(str(dump))
+    assert (second.parsed, second.removed) == (0, 1)
+    assert gone not in store.dump_cards()
+    assert len(store.load_cards()) == len(unique) - 1
+    assert not {'cards_by_id.json', 'cards_checkpoint.json'} & set(os.listdir(tmp_path))